@@ -69,27 +69,66 @@ except ModuleNotFoundError:  # if streamlink doesn't installed, install by pip.
 # Import
 
 import os
+import ssl
+import copy
 import json
 import time
+import shutil
+import signal
+import hashlib
+import subprocess
+import threading
+import datetime
+import asyncio
+import concurrent.futures as cf
 import contextlib as ctl
 import collections as col
 import functools as ft
 import itertools as it
 import typing
+import urllib.parse as urlparse
 
 import tkinter as tk
 import tkinter.ttk as ttk
 import tkinter.filedialog as tkf
 import tkinter.messagebox as tkm
 
+import requests
 from streamlink.session import Streamlink
 from streamlink.exceptions import StreamError, NoPluginError, PluginError
+from streamlink.stream.hls import HLSStream
+from streamlink.stream.http import HTTPStream
 
 
 # Global constant
 
-CHUNK_SIZE: (int, float) = 8192
+CHUNK_SIZE: (int, float) = 65536   # per read of stream, few reads keep progress cheap
 MAX_VIDEO: int = 50
+HTTP_TIMEOUT: (int, float) = 20
+ASYNC_MAX_REQUESTS: int = 32   # in-flight requests of the whole event loop
+ASYNC_QUEUE_SIZE: int = 4   # fetched segments waiting for writer, per stream
+ASYNC_WRITERS: int = 8   # threads writing outputs of all streams
+HLS_LIVE_EDGE: int = 3
+HLS_ATTEMPTS: int = 3   # of each segment and playlist reload, unless set in session
+HLS_RETRY_DELAY: (int, float) = 1   # seconds between attempts
+ROTATE_TEMPLATE: str = "{name}.{index:03d}{ext}"
+STDOUT: str = "-"
+PIPE_PREFIX: str = "pipe:"
+MANIFEST_SUFFIX: str = ".manifest.json"
+TS_PACKET_SIZE: int = 188
+TS_SYNC_BYTE: int = 0x47
+CACHE_DIR: str = None  # directory of segment cache, e.g. "~/.cache/downloader"
+CACHE_MAX_SIZE: int = 2 * 1024 ** 3
+# read when download starts, so it may be set after import,
+# e.g. downloader.POST_PROCESSOR = downloader._Command(downloader.FFMPEG_REMUX)
+POST_PROCESSOR: typing.Callable = None
+POST_PROCESS_WORKERS: int = 2
+PROBE_WORKERS: int = 8
+PROGRESS_INTERVAL: (int, float) = 0.5  # seconds between rate samples
+PROGRESS_ALPHA: float = 0.3  # weight of newest sample in moving average
+FFMPEG_REMUX: typing.Sequence = (
+    "ffmpeg", "-y", "-loglevel", "error", "-i", "{input}", "-c", "copy", "{name}.mp4"
+)
 ROOT_TITLE: str = "Stream-based video downloader"
 ROOT_RESIZABLE: typing.Sequence = (0, 0)
 FILETYPES: typing.Sequence = (
@@ -105,13 +144,667 @@ INFO_TEXT: str = (
 
 # Internal function
 
+def _resolve_stream(
+        url: str,
+        streamlink: Streamlink,
+) -> (str, object, str):
+    """
+    Finds the best stream of url.
+    Returns (name, stream, error) and error is None when found.
+    """
+    try:
+        streams = streamlink.streams(url)
+    except NoPluginError:
+        return None, None, "No plugin can handle URL: {0}".format(url)
+    except PluginError as err:
+        return None, None, str(err)
+    if not streams:
+        return None, None, "No playable streams found on this URL: {0}".format(url)
+    name = stream = None
+    for name, stream in streams.items():
+        if stream is streams['best'] and (
+                name not in
+                ["best", "worst", "best-unfiltered", "worst-unfiltered"]
+        ):
+            stream = streams[name]
+            break
+    return name, stream, None
+
+
+def _request_args(stream) -> dict:
+    """Request arguments of stream (headers, cookies, ...) for its playlist and segments."""
+    return {
+        key: value for key, value in getattr(stream, "args", {}).items()
+        if key not in ("url", "method")
+    }
+
+
+_Segment = col.namedtuple('_Segment', ['number', 'uri', 'duration', 'offset'])
+_Playlist = col.namedtuple(
+    '_Playlist', ['segments', 'target_duration', 'endlist', 'unsupported']
+)
+
+
+def _parse_playlist(text: str, base_url: str) -> _Playlist:
+    """
+    Parses HLS media playlist, only the plain MPEG-TS subset.
+    unsupported holds the reason when playlist cannot be fetched as is.
+    """
+    segments = []
+    sequence = 0
+    target_duration = duration = offset = 0.0
+    endlist = False
+    unsupported = None
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        tag, _, value = line.partition(':')
+        if tag == '#EXT-X-MEDIA-SEQUENCE':
+            sequence = int(value)
+        elif tag == '#EXT-X-TARGETDURATION':
+            target_duration = float(value)
+        elif tag == '#EXTINF':
+            duration = float(value.split(',', 1)[0])
+        elif tag == '#EXT-X-ENDLIST':
+            endlist = True
+        elif tag == '#EXT-X-KEY' and 'METHOD=NONE' not in value:
+            unsupported = "encrypted segments"
+        elif tag in ('#EXT-X-MAP', '#EXT-X-BYTERANGE'):
+            unsupported = "{0} tag".format(tag[1:])
+        elif tag == '#EXT-X-STREAM-INF':
+            unsupported = "variant playlist"
+        elif not line.startswith('#'):
+            segments.append(_Segment(
+                sequence + len(segments),
+                urlparse.urljoin(base_url, line),
+                duration, offset,
+            ))
+            offset += duration
+            duration = 0.0
+    return _Playlist(segments, target_duration, endlist, unsupported)
+
+
+class _UnsupportedPlaylist(IOError):
+    """Playlist which cannot be fetched segment by segment."""
+
+
+def _fresh_segments(playlist: _Playlist, last: (int, None)) -> list:
+    """
+    Returns segments after number last.
+    On first load of live playlist, starts from HLS_LIVE_EDGE segments.
+    """
+    if playlist.unsupported:
+        raise _UnsupportedPlaylist(
+            "Unsupported playlist: {0}".format(playlist.unsupported)
+        )
+    if last is None:
+        if playlist.endlist:
+            return playlist.segments
+        return playlist.segments[-HLS_LIVE_EDGE:]
+    return [segment for segment in playlist.segments if segment.number > last]
+
+
+def _reload_delay(playlist: _Playlist, fresh: list) -> float:
+    """Waits target duration, or half of it when nothing was new."""
+    delay = max(playlist.target_duration, 1.0)
+    return delay if fresh else delay / 2
+
+
+def _clip_segments(
+        fresh: list, position: float,
+        start: float = None, end: float = None,
+) -> (list, float, bool):
+    """
+    Picks segments of fresh overlapping start..end seconds of stream,
+    position is offset of first fresh one (from recording start while live).
+    Returns (picked segments, next position, whether end is reached).
+    """
+    picked = []
+    for segment in fresh:
+        begin, position = position, position + segment.duration
+        if end is not None and begin >= end:
+            return picked, position, True
+        if start is None or position > start:
+            picked.append(segment)
+    return picked, position, False
+
+
+class _SegmentData(bytes):
+    """
+    Data of a whole segment, which marks a segment boundary.
+    position is media seconds fetched so far including this segment,
+    planned is media seconds to fetch in total (None while live).
+    """
+
+    duration = position = 0.0
+    planned = None
+
+    @classmethod
+    def of(
+            cls, data: bytes, segment: _Segment,
+            position: float = 0.0, planned: float = None,
+    ):
+        self = cls(data)
+        self.duration = segment.duration
+        self.position = position
+        self.planned = planned
+        return self
+
+
+def _iter_hls(
+        streamlink: Streamlink, url: str,
+        cache: '_SegmentCache' = None,
+        start: float = None, end: float = None,
+        args: dict = None,
+) -> typing.Iterator:
+    """
+    Yields _SegmentData of HLS media playlist, polling it while live.
+    Only one segment is held at once, however long stream runs.
+    With start/end, only segments overlapping that range are fetched.
+    args (of _request_args) are passed to every request.
+    Failed requests are retried as many times as session options say.
+    """
+    args = args or {}
+    attempts, reloads, timeout = _retry_options(streamlink)
+    last = planned = None
+    position = fetched = 0.0
+    while True:
+        res = _retry(
+            reloads, streamlink.http.get,
+            url, timeout=timeout, exception=IOError, **args
+        )
+        playlist = _parse_playlist(res.text, res.url)
+        fresh = _fresh_segments(playlist, last)
+        picked, position, finished = _clip_segments(fresh, position, start, end)
+        if last is None and playlist.endlist:
+            planned = sum(segment.duration for segment in picked)
+        if fresh:
+            last = fresh[-1].number
+        for segment in picked:
+            data = _retry(
+                attempts, _fetch_segment,
+                streamlink, segment.uri, cache, args, timeout,
+            )
+            fetched += segment.duration
+            yield _SegmentData.of(data, segment, fetched, planned)
+        if finished or playlist.endlist:
+            return
+        time.sleep(_reload_delay(playlist, fresh))
+
+
+def _retry_options(streamlink: Streamlink) -> (int, int, float):
+    """
+    Returns (segment attempts, playlist reload attempts, segment timeout)
+    of session, whose option names differ across streamlink versions.
+    """
+
+    def option(names, default):
+        for name in names:
+            with ctl.suppress(KeyError):  # unknown to this version
+                value = streamlink.get_option(name)
+                if value is not None:
+                    return value
+        return default
+
+    return (
+        max(int(option(
+            ("stream-segment-attempts", "hls-segment-attempts"), HLS_ATTEMPTS
+        )), 1),
+        max(int(option(("hls-playlist-reload-attempts",), HLS_ATTEMPTS)), 1),
+        option(("stream-segment-timeout", "hls-segment-timeout"), HTTP_TIMEOUT),
+    )
+
+
+def _retry(attempts: int, func: typing.Callable, *args, **kwargs):
+    """Calls func up to attempts times while it raises IOError."""
+    for attempt in range(1, attempts + 1):
+        try:
+            return func(*args, **kwargs)
+        except IOError:
+            if attempt >= attempts:
+                raise
+            time.sleep(HLS_RETRY_DELAY)
+
+
+def _fetch_segment(
+        streamlink: Streamlink, url: str,
+        cache: '_SegmentCache' = None,
+        args: dict = None,
+        timeout: (int, float) = HTTP_TIMEOUT,
+) -> bytes:
+    """
+    Gets segment, from cache when its url and length are cached.
+    Failed HEAD or unknown length is just a cache miss.
+    """
+    args = args or {}
+    data = None
+    if cache is not None:
+        try:
+            res = streamlink.http.head(
+                url, timeout=timeout, exception=IOError,
+                allow_redirects=True, **args
+            )
+            length = int(res.headers["Content-Length"])
+        except (IOError, KeyError, ValueError):
+            cache.misses += 1
+        else:
+            data = cache.get(url, length)
+    if data is None:
+        data = streamlink.http.get(
+            url, timeout=timeout, exception=IOError, **args
+        ).content
+        if cache is not None:
+            cache.put(url, data)
+    return data
+
+
+class _SegmentCache(object):
+    """
+    On-disk LRU cache of segments, shared across jobs and retries.
+    Keyed by segment url and content length, bounded by max_size bytes.
+    """
+
+    suffix = ".seg"
+
+    def __init__(self, directory: str, max_size: int = CACHE_MAX_SIZE):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.max_size = max_size
+        self.hits = self.misses = self.evictions = 0
+        self.hit_bytes = self.evicted_bytes = 0
+        self._entries = col.OrderedDict()  # path: size, least recently used first
+        found = []
+        for entry in os.scandir(directory):
+            if entry.name.endswith(self.suffix) and entry.is_file():
+                stat = entry.stat()
+                found.append((stat.st_mtime, entry.path, stat.st_size))
+        for _, path, size in sorted(found):
+            self._entries[path] = size
+        self.size = sum(self._entries.values())
+        self._evict()
+
+    def _path(self, url: str, length: int) -> str:
+        key = hashlib.sha256("{0}\n{1}".format(url, length).encode()).hexdigest()
+        return os.path.join(self.directory, key + self.suffix)
+
+    def get(self, url: str, length: int) -> (bytes, None):
+        path = self._path(url, length)
+        data = None
+        if path in self._entries:
+            try:
+                with open(path, "rb") as file:
+                    data = file.read()
+            except (IOError, OSError):
+                pass
+            if data is None or len(data) != length:  # removed or broken
+                self._remove(path)
+                data = None
+        if data is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(path)
+        with ctl.suppress(OSError):
+            os.utime(path)
+        self.hits += 1
+        self.hit_bytes += length
+        return data
+
+    def put(self, url: str, data: bytes):
+        path = self._path(url, len(data))
+        try:
+            with open(path + ".tmp", "wb") as file:
+                file.write(data)
+            os.replace(path + ".tmp", path)
+        except (IOError, OSError):  # cache is optional, never fails download
+            return
+        self.size += len(data) - self._entries.pop(path, 0)
+        self._entries[path] = len(data)
+        self._evict()
+
+    def assemble(self, entries: typing.Iterable, filename: str) -> int:
+        """
+        Writes cached segments of (url, length) entries into filename in order.
+        Raises KeyError of url before writing, if any segment is not cached.
+        """
+        entries = list(entries)
+        for url, length in entries:
+            if self._path(url, length) not in self._entries:
+                raise KeyError(url)
+        written = 0
+        with _create_file(filename) as output:
+            for url, length in entries:
+                data = self.get(url, length)
+                if data is None:
+                    raise KeyError(url)
+                output.write(data)
+                written += len(data)
+        return written
+
+    def stats(self) -> dict:
+        return {
+            "size": self.size, "entries": len(self._entries),
+            "hits": self.hits, "misses": self.misses, "hit_bytes": self.hit_bytes,
+            "evictions": self.evictions, "evicted_bytes": self.evicted_bytes,
+        }
+
+    def _evict(self):
+        while self.size > self.max_size and self._entries:
+            path = next(iter(self._entries))
+            self.evictions += 1
+            self.evicted_bytes += self._entries[path]
+            self._remove(path)
+
+    def _remove(self, path: str):
+        self.size -= self._entries.pop(path, 0)
+        with ctl.suppress(OSError):
+            os.remove(path)
+
+
+class _RotatingFile(object):
+    """
+    Output which starts a new part at segment boundaries,
+    once current part reaches max_duration seconds or max_size bytes.
+    Each finished part is fsynced, so it can be processed while recording.
+    template fields: name, ext, index (from 1), time (datetime of part).
+    With wrap(file, part_filename), e.g. _HashingWriter, each part is wrapped,
+    finished with its own manifest, and finish writes index manifest of parts.
+    on_part(part_filename) is called when each part is completely written.
+    """
+
+    def __init__(
+            self, filename: str,
+            template: str = ROTATE_TEMPLATE,
+            max_duration: (int, float) = None,
+            max_size: int = None,
+            wrap: typing.Callable = None,
+            on_part: typing.Callable = None,
+    ):
+        self.filename = filename
+        self.name, self.ext = os.path.splitext(filename)
+        self.template = template
+        self.max_duration = max_duration
+        self.max_size = max_size
+        self.wrap = wrap
+        self.on_part = on_part
+        self.parts = []
+        self.manifests = []
+        self.finished = False
+        self._file = None
+        self._size = self._duration = 0
+        self._open()
+
+    def write(self, data: bytes):
+        if self._file is None:
+            self._open()
+        self._file.write(data)
+        self._size += len(data)
+        if isinstance(data, _SegmentData):
+            self._duration += data.duration
+            if (
+                    self.max_size and self._size >= self.max_size or
+                    self.max_duration and self._duration >= self.max_duration
+            ):
+                self._finish()
+
+    def finish(self):
+        if self._file is not None:
+            self._finish()
+        if self.wrap is not None:
+            manifest = {
+                "file": os.path.basename(self.filename),
+                "complete": True,
+                "parts": self.manifests,
+            }
+            with open(self.filename + MANIFEST_SUFFIX, "w") as file:
+                json.dump(manifest, file, indent=2)
+        self.finished = True
+
+    def close(self):
+        if self._file is not None:
+            self._finish(complete=False)
+        if self.wrap is not None and not self.finished:
+            with ctl.suppress(OSError):
+                os.remove(self.filename + MANIFEST_SUFFIX)
+
+    def _open(self):
+        filename = self.template.format(
+            name=self.name, ext=self.ext,
+            index=len(self.parts) + 1, time=datetime.datetime.now(),
+        )
+        self._file = _create_file(filename)
+        if self.wrap is not None:
+            self._file = self.wrap(self._file, filename)
+        self.parts.append(filename)
+        self._size = self._duration = 0
+
+    def _finish(self, complete: bool = True):
+        file, self._file = self._file, None
+        try:
+            file.flush()
+            os.fsync(file.fileno())
+            if complete and self.wrap is not None:
+                manifest = file.finish()
+                del manifest["complete"]
+                self.manifests.append(dict(part=manifest.pop("file"), **manifest))
+        finally:
+            file.close()
+        if complete and self.on_part is not None:
+            self.on_part(self.parts[-1])
+
+
+class _HashingWriter(object):
+    """
+    Output wrapper which hashes data as it is written,
+    and writes sidecar manifest (hashes, byte and segment count) on finish,
+    which is called only when transfer completed.
+    Closing without finish removes stale manifest instead.
+    With check_ts, also checks sync byte of every MPEG-TS packet.
+    """
+
+    def __init__(
+            self, output, filename: str,
+            algorithms: typing.Sequence = ("sha256",),
+            check_ts: bool = False,
+    ):
+        self.output = output
+        self.filename = filename
+        self.hashes = [hashlib.new(name) for name in algorithms]
+        self.check_ts = check_ts
+        self.bytes = self.ts_errors = 0
+        self.segments = None
+        self.finished = False
+
+    def write(self, data: bytes):
+        self.output.write(data)
+        for h in self.hashes:
+            h.update(data)
+        if self.check_ts:
+            # sync bytes of this chunk, continuing packet position of previous one
+            sync = data[-self.bytes % TS_PACKET_SIZE::TS_PACKET_SIZE]
+            self.ts_errors += len(sync) - sync.count(TS_SYNC_BYTE)
+        if isinstance(data, _SegmentData):
+            self.segments = (self.segments or 0) + 1
+        self.bytes += len(data)
+
+    def flush(self):
+        self.output.flush()
+
+    def fileno(self) -> int:
+        return self.output.fileno()
+
+    def finish(self) -> dict:
+        manifest = {
+            "file": os.path.basename(self.filename),
+            "complete": True,
+            "bytes": self.bytes,
+            "segments": self.segments,
+            "hashes": {h.name: h.hexdigest() for h in self.hashes},
+        }
+        if self.check_ts:
+            manifest["ts_sync"] = {
+                "packets": -(-self.bytes // TS_PACKET_SIZE),
+                "errors": self.ts_errors,
+            }
+        with open(self.filename + MANIFEST_SUFFIX, "w") as file:
+            json.dump(manifest, file, indent=2)
+        self.finished = True
+        return manifest
+
+    def close(self):
+        self.output.close()
+        if not self.finished:
+            with ctl.suppress(OSError):
+                os.remove(self.filename + MANIFEST_SUFFIX)
+
+
+def _needs_segments(
+        max_duration: (int, float) = None,
+        max_size: int = None,
+        **_
+) -> bool:
+    """
+    Returns whether output options work only on segment boundaries of HLS.
+    Hashes and TS check do not: they count segments only when segments
+    are fetched anyway, and record null otherwise.
+    """
+    return bool(max_duration or max_size)
+
+
+class _CallbackSink(object):
+    """
+    Output which passes data to caller-supplied writable or callable.
+    It is never closed here, only flushed if it can be.
+    Consumer gone on close (e.g. broken pipe) is already reported by write or flush.
+    """
+
+    def __init__(self, target):
+        self.target = target
+        self._write = target.write if hasattr(target, "write") else target
+
+    def write(self, data: bytes):
+        self._write(data)
+
+    def flush(self):
+        flush = getattr(self.target, "flush", None)
+        if flush is not None:
+            flush()
+
+    def close(self):
+        with ctl.suppress(OSError):
+            self.flush()
+
+
+def _create_file(filename: str) -> typing.BinaryIO:
+    """
+    Opens filename to write as a new file, instead of truncating it in place,
+    so that its other hardlinks (deduplicated outputs) keep their data.
+    """
+    with ctl.suppress(FileNotFoundError):
+        os.remove(filename)
+    return open(filename, "wb")  # write as binary mode
+
+
+def _is_path(target) -> bool:
+    """Whether output target is a regular file path."""
+    return (
+        isinstance(target, str) and target != STDOUT and
+        not target.startswith(PIPE_PREFIX)
+    )
+
+
+def _output_name(target) -> str:
+    """Short name of output target to show."""
+    if _is_path(target):
+        return os.path.basename(target)
+    if target == STDOUT:
+        return "<stdout>"
+    if isinstance(target, str):
+        return target
+    return getattr(target, "name", None) or "<{0}>".format(type(target).__name__)
+
+
+def _open_sink(target) -> typing.BinaryIO:
+    """
+    Opens output sink of target: file path, STDOUT, PIPE_PREFIX + path of
+    named pipe (created if missing), or writable or callable taking data.
+    Writes block while consumer does not read, so consumer's pace is kept.
+    """
+    if not isinstance(target, str):
+        return _CallbackSink(target)
+    if target == STDOUT:
+        return _CallbackSink(sys.stdout.buffer)
+    if target.startswith(PIPE_PREFIX):
+        target = target[len(PIPE_PREFIX):]
+        if not os.path.exists(target) and hasattr(os, "mkfifo"):
+            os.mkfifo(target)
+        return open(target, "wb")
+    return _create_file(target)
+
+
+def _open_output(
+        filename,
+        max_duration: (int, float) = None,
+        max_size: int = None,
+        template: str = ROTATE_TEMPLATE,
+        hashes: typing.Sequence = None,
+        check_ts: bool = False,
+        on_part: typing.Callable = None,
+):
+    """
+    Opens writable output of filename with output options of _download.
+    filename may be any target of _open_sink, if no options need file path.
+    hashes (e.g. ["sha256", "blake2b"]) or check_ts writes sidecar manifest,
+    for each part and index of parts if rotated.
+    on_part(part_filename) is called with each finished part, if rotated.
+    """
+    if (max_duration or max_size or hashes or check_ts) and not _is_path(filename):
+        raise ValueError("Rotation and manifest require file path output")
+    wrap = None
+    if hashes or check_ts:
+        for name in hashes or ():
+            hashlib.new(name)  # raises ValueError for unknown algorithm before opening
+
+        def wrap(file, name):
+            return _HashingWriter(file, name, hashes or (), check_ts)
+
+    if max_duration or max_size:
+        return _RotatingFile(
+            filename, template, max_duration, max_size, wrap, on_part
+        )
+    output = _open_sink(filename)
+    return output if wrap is None else wrap(output, filename)
+
+
+def _finish_output(output):
+    """
+    Flushes output and tells it that transfer completed, if it cares
+    (e.g. manifest), so that errors of both are reported before close.
+    """
+    for name in ("flush", "finish"):
+        method = getattr(output, name, None)
+        if method is not None:
+            method()
+
+
 def _download(
-        url: str, filename: str,
+        url: str, filename,
         streamlink: Streamlink = None,
         progress_iterator: typing.Callable = None,
+        cache: _SegmentCache = None,
+        stream: object = None,
+        start: float = None,
+        end: float = None,
+        **output_options
 ) -> (str, None):
     """
     Downloads video with using streamlink module.
+    filename may also be other output target of _open_sink, like STDOUT.
+    start/end (seconds) fetches only HLS segments overlapping that range,
+    or is left to streamlink for playlists which cannot be fetched by segment.
+    stream is used instead of resolving url again, if given.
+    HLS segments are looked up in cache first, if given.
+    output_options are passed to _open_output (e.g. rotation of recording).
     """
 
     output = stream_fd = None
@@ -120,52 +813,63 @@ def _download(
 
     try:
         # Get stream object
-        try:
-            streams = streamlink.streams(url)
-        except NoPluginError:
-            return "No plugin can handle URL: {0}".format(url)
-        except PluginError as err:
-            return str(err)
-        if not streams:
-            return "No playable streams found on this URL: {0}".format(url)
-        stream = None
-        for name, stream in streams.items():
-            if stream is streams['best'] and (
-                    name not in
-                    ["best", "worst", "best-unfiltered", "worst-unfiltered"]
-            ):
-                stream = streams[name]
-                break
+        if stream is None:
+            name, stream, error = _resolve_stream(url, streamlink)
+            if error:
+                return error
 
         # Get pre-buffer data from stream
-        try:
-            stream_fd = stream.open()
-        except StreamError as err:
-            return "Could not open stream: {0}".format(err)
-        try:
-            pre_buffer = stream_fd.read(CHUNK_SIZE)
-        except IOError as err:
-            stream_fd.close()
-            return "Failed to read data from stream: {0}".format(err)
+        rotating = _needs_segments(**output_options)
+        ranged = start is not None or end is not None
+        required = rotating or ranged
+        if required and not isinstance(stream, HLSStream):
+            return "Time range or rotating output requires HLS stream: {0}".format(url)
+        stream_iterator = None
+        # otherwise reader of streamlink, with its retries and hls-* options
+        if (required or cache is not None) and isinstance(stream, HLSStream):
+            stream_iterator = _iter_hls(
+                streamlink, stream.url, cache, start, end, _request_args(stream)
+            )
+            try:
+                pre_buffer = next(stream_iterator, b"")
+            except _UnsupportedPlaylist as err:
+                if rotating:
+                    return "Failed to read data from stream: {0}".format(err)
+                stream_iterator = None  # fall back to stream of streamlink
+                if ranged:
+                    stream = copy.copy(stream)
+                    stream.start_offset = start or 0.0
+                    stream.duration = end - (start or 0.0) if end is not None else None
+            except IOError as err:
+                return "Failed to read data from stream: {0}".format(err)
+        if stream_iterator is None:
+            try:
+                stream_fd = stream.open()
+            except StreamError as err:
+                return "Could not open stream: {0}".format(err)
+            stream_iterator = iter(ft.partial(stream_fd.read, CHUNK_SIZE), b"")
+            try:
+                pre_buffer = stream_fd.read(CHUNK_SIZE)
+            except IOError as err:
+                stream_fd.close()
+                return "Failed to read data from stream: {0}".format(err)
         if not pre_buffer:
-            stream_fd.close()
+            if stream_fd:
+                stream_fd.close()
             return "No data returned from stream"
 
         # Write all data onto output file from stream
         try:
-            output = open(filename, "wb")  # write as binary mode
-        except (IOError, OSError) as err:
+            output = _open_output(filename, **output_options)
+        except (IOError, OSError, ValueError) as err:
             return "Failed to open output: {0} ({1})".format(filename, err)
         with ctl.closing(output):
-            stream_iterator = it.chain(
-                [pre_buffer],
-                iter(ft.partial(stream_fd.read, CHUNK_SIZE), b"")
-            )
+            stream_iterator = it.chain([pre_buffer], stream_iterator)
             # Timestamp
             if progress_iterator is not None:
                 stream_iterator = progress_iterator(
                     stream_iterator,
-                    prefix=os.path.basename(filename),
+                    prefix=_output_name(filename),
                 )
             try:
                 for data in stream_iterator:
@@ -176,7 +880,12 @@ def _download(
             except IOError as err:
                 return "Error when reading from stream: {0}, exiting".format(err)
             finally:
-                stream_fd.close()
+                if stream_fd:
+                    stream_fd.close()
+            try:
+                _finish_output(output)
+            except (IOError, OSError) as err:
+                return "Error when writing to output: {0}, exiting".format(err)
 
     except KeyboardInterrupt:
         if output:
@@ -194,26 +903,300 @@ def _download(
             raise KeyboardInterrupt
 
 
-def download(iterable: typing.Sequence = None) -> int:
+def _parse_time(value: (str, int, float, None)) -> (float, None):
+    """Parses seconds or [[hh:]mm:]ss into seconds. Empty value is None."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        seconds = float(value)
+    else:
+        seconds = 0.0
+        for part in str(value).strip().split(":"):
+            seconds = seconds * 60 + float(part)
+    if seconds < 0:
+        raise ValueError("Negative time: {0}".format(value))
+    return seconds
+
+
+def _unpack_job(job: typing.Sequence) -> tuple:
+    """Unpacks (url, filename[, start[, end]]) into 4-tuple of job."""
+    if not 2 <= len(job) <= 4:
+        raise ValueError("Invalid job: {0!r}".format(job))
+    url, filename, start, end = (list(job) + [None, None])[:4]
+    start, end = _parse_time(start), _parse_time(end)
+    if start is not None and end is not None and start >= end:
+        raise ValueError("Start must be before end: {0!r}".format(job))
+    return url, filename, start, end
+
+
+def _download_once(
+        url: str, filename: str,
+        done: dict,
+        streamlink: Streamlink = None,
+        start: float = None,
+        end: float = None,
+        **kwargs
+) -> (str, str):
+    """
+    Downloads like _download, but when same url or stream (of same range)
+    is in done, replicates that finished file instead of fetching it again.
+    done maps url and stream url with range to filename, updated on success,
+    and loses entries of filename when it is rewritten.
+    Returns (error, filename replicated from).
+    """
+    if _needs_segments(**kwargs) or not _is_path(filename):
+        # rotated parts or other targets are not one file to replicate
+        return _download(
+            url, filename, streamlink=streamlink, start=start, end=end, **kwargs
+        ), None
+    streamlink = streamlink or Streamlink()
+    keys = [(url, start, end)]
+    source = done.get(keys[0])
+    stream = None
+    if source is None:
+        name, stream, error = _resolve_stream(url, streamlink)
+        if error:
+            return error, None
+        if getattr(stream, "url", None):
+            keys.append((stream.url, start, end))
+            source = done.get(keys[1])
+    if source is not None and os.path.abspath(source) == os.path.abspath(filename):
+        return None, source
+    # filename is rewritten: stream recorded there before is gone
+    for key, value in list(done.items()):
+        if os.path.abspath(value) == os.path.abspath(filename):
+            del done[key]
+    if source is not None:
+        return _replicate(source, filename), source
+    error = _download(
+        url, filename, streamlink=streamlink, stream=stream,
+        start=start, end=end, **kwargs
+    )
+    if not error:
+        done.update(dict.fromkeys(keys, filename))
+    return error, None
+
+
+def _replicate(source: str, filename: str) -> (str, None):
+    """
+    Makes filename same as downloaded source by hardlink, reflink or copy.
+    Sidecar manifest of source is replicated too.
+    """
+    if os.path.abspath(source) == os.path.abspath(filename):
+        return None
+    try:
+        if os.path.lexists(filename):
+            os.remove(filename)
+        try:
+            os.link(source, filename)
+        except OSError:
+            if not _reflink(source, filename):
+                shutil.copyfile(source, filename)
+        if os.path.isfile(source + MANIFEST_SUFFIX):
+            with open(source + MANIFEST_SUFFIX) as file:
+                manifest = json.load(file)
+            manifest["file"] = os.path.basename(filename)
+            with open(filename + MANIFEST_SUFFIX, "w") as file:
+                json.dump(manifest, file, indent=2)
+    except (IOError, OSError, ValueError) as err:
+        return "Failed to replicate {0} as output: {1} ({2})".format(
+            source, filename, err
+        )
+    return None
+
+
+def _reflink(source: str, filename: str) -> bool:
+    """Clones source as copy-on-write file if filesystem supports it."""
+    try:
+        import fcntl
+    except ImportError:  # not on posix
+        return False
+    ficlone = 0x40049409  # FICLONE of linux ioctl
+    with open(source, "rb") as src, open(filename, "wb") as dst:
+        try:
+            fcntl.ioctl(dst.fileno(), ficlone, src.fileno())
+            return True
+        except OSError:
+            pass
+    os.remove(filename)
+    return False
+
+
+def download(
+        iterable: typing.Sequence = None,
+        engine: str = 'sync',
+        cache: _SegmentCache = None,
+        post_processor: typing.Callable = None,
+        metrics: str = None,
+        **output_options
+) -> int:
     # for console usage (not used in main program)
-    """Download video using information in iterable sequence."""
-    from streamlink_cli.utils import progress
+    """
+    Download video using information in iterable sequence,
+    of (url, filename[, start[, end]]) with start/end in seconds or hh:mm:ss.
+    engine='async' records every item at once on one event loop,
+    which does not use cache (nor deduplication).
+    output_options are passed to _download (e.g. max_duration=3600).
+    Same stream queued for several filenames is fetched only once.
+    Downloaded files are handed to post_processor while downloading others.
+    Progress is written to stderr, and as json into metrics file if given.
+    """
+    if engine == 'async' and cache is not None:
+        sys.stderr.write("Segment cache is not supported by async engine\n")
+        sys.stderr.flush()
+        return 1
+    try:
+        jobs = [_unpack_job(job) for job in iterable]
+    except (TypeError, ValueError) as err:
+        sys.stderr.write("{0}\n".format(err))
+        sys.stderr.flush()
+        return 1
+    clock = _MeterClock()
+    progress = _make_console_progress(clock, metrics)
     session = Streamlink()
+    done = {}
+    stage = _PostProcessStage(post_processor) if post_processor else None
+    rotating = _needs_segments(**output_options)
+    if stage and rotating:
+        # only parts exist, each handed over as soon as it is finished
+        output_options = dict(output_options, on_part=stage.submit)
+
+    def submit(filename):
+        if stage and not rotating and _is_path(filename):
+            stage.submit(filename)
+
     try:
-        for url, filename in iterable:
-            result = _download(
-                url, filename, streamlink=session, progress_iterator=progress
-            )
-            if result:
-                sys.stderr.write(result)
-                sys.stderr.write("\n")
-                sys.stderr.flush()
+        if engine == 'async':
+            results = _AsyncEngine(
+                session, clock=clock, report=ft.partial(
+                    _report_console, metrics=metrics
+                ), on_done=submit, **output_options
+            ).run(jobs)
+            failed = 0
+            for job, result in zip(jobs, results):
+                if result:
+                    failed = 1
+                    sys.stderr.write("{0}: {1}\n".format(job[1], result))
+            sys.stderr.flush()
+            if failed:
                 return 1
+        else:
+            for url, filename, start, end in jobs:
+                result, source = _download_once(
+                    url, filename, done, start=start, end=end,
+                    streamlink=session, progress_iterator=progress,
+                    cache=cache, **output_options
+                )
+                if source:
+                    sys.stderr.write("{0}: same stream as {1}, deduplicated\n".format(
+                        filename, source
+                    ))
+                    sys.stderr.flush()
+                if result:
+                    sys.stderr.write(result)
+                    sys.stderr.write("\n")
+                    sys.stderr.flush()
+                    return 1
+                submit(filename)
+        if stage:
+            while not stage.poll(timeout=1):
+                sys.stderr.write("Post-processing: {0}\n".format(stage.status()))
+                sys.stderr.flush()
+            for filename, error in stage.errors:
+                sys.stderr.write("{0}: {1}\n".format(filename, error))
+            sys.stderr.flush()
+            return 1 if stage.errors else 0
         return 0
     except KeyboardInterrupt:
+        if stage:
+            stage.close(cancel=True)
+            stage = None
         sys.stderr.write("Interrupted, terminating...")
         sys.stderr.flush()
         return 130
+    finally:
+        if stage:
+            stage.close()
+        clock.close()
+
+
+_Probe = col.namedtuple(
+    '_Probe', ['url', 'filename', 'plugin', 'variant', 'kind', 'segment', 'error']
+)
+
+
+def _probe(job: typing.Sequence, streamlink: Streamlink) -> _Probe:
+    """
+    Checks job without downloading: plugin matched, playlist reachable,
+    variant chosen and first segment (or file of HTTP stream) HEAD-able.
+    """
+    url, filename = job[:2]
+    plugin = variant = kind = segment = None
+    try:
+        resolved = streamlink.resolve_url(url)
+        # (name, class, url) of streamlink>=5, plugin instance of older one
+        plugin = resolved[0] if isinstance(resolved, tuple) else resolved.module
+        variant, stream, error = _resolve_stream(url, streamlink)
+        if error:
+            return _Probe(url, filename, plugin, variant, kind, segment, error)
+        kind = type(stream).__name__
+        args = _request_args(stream)
+        if isinstance(stream, HLSStream):
+            res = streamlink.http.get(
+                stream.url, timeout=HTTP_TIMEOUT, exception=IOError, **args
+            )
+            playlist = _parse_playlist(res.text, res.url)
+            if not playlist.segments:
+                raise IOError("No segment in playlist")
+            segment = playlist.segments[0].uri
+        elif isinstance(stream, HTTPStream):
+            segment = stream.url
+        if segment is not None:
+            streamlink.http.head(
+                segment, timeout=HTTP_TIMEOUT, exception=IOError,
+                allow_redirects=True, **args
+            )
+    except NoPluginError:
+        error = "No plugin can handle URL: {0}".format(url)
+    except (IOError, PluginError, StreamError, ValueError) as err:
+        error = str(err)
+    return _Probe(url, filename, plugin, variant, kind, segment, error)
+
+
+def _probe_all(
+        iterable: typing.Iterable,
+        streamlink: Streamlink = None,
+        workers: int = PROBE_WORKERS,
+) -> list:
+    """Probes every job at once in bounded thread pool, in order of jobs."""
+    streamlink = streamlink or Streamlink()
+    with cf.ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(ft.partial(_probe, streamlink=streamlink), iterable))
+
+
+def _format_probe_table(results: typing.Sequence) -> str:
+    """Formats probe results as one text table."""
+    rows = [("file", "plugin", "variant", "type", "result")]
+    for result in results:
+        rows.append((
+            _output_name(result.filename), result.plugin or "-",
+            result.variant or "-", result.kind or "-", result.error or "ok",
+        ))
+    widths = [max(len(str(row[i])) for row in rows) for i in range(4)]
+    return "\n".join(
+        "  ".join(str(cell).ljust(width) for cell, width in zip(row, widths)) +
+        "  " + row[4] for row in rows
+    )
+
+
+def probe(iterable: typing.Sequence = None) -> int:
+    # for console usage (not used in main program)
+    """Checks every video of iterable at once and prints result table."""
+    results = _probe_all(iterable)
+    sys.stdout.write(_format_probe_table(results))
+    sys.stdout.write("\n")
+    sys.stdout.flush()
+    return 1 if any(result.error for result in results) else 0
 
 
 def format_filesize(size: (int, float)) -> str:
@@ -240,6 +1223,17 @@ def format_time(elapsed: (int, float)) -> str:
     )
 
 
+def format_offset(offset: (int, float, None)) -> str:
+    """Formats offset seconds of video into h:mm:ss. None is empty."""
+    if offset is None:
+        return ""
+    # rounded first, not to carry 59.9996 over as "60" seconds
+    minutes, seconds = divmod(round(offset, 3), 60)
+    hours, minutes = divmod(int(minutes), 60)
+    seconds = ("%06.3f" % seconds).rstrip("0").rstrip(".")
+    return "{0}:{1:02d}:{2}".format(hours, minutes, seconds)
+
+
 def _ask_new_file() -> str:
     filename = tkf.asksaveasfilename(
         title="Save video as..",
@@ -257,6 +1251,666 @@ def _check_filename(filename: str) -> str:
     return filename
 
 
+# Progress
+
+class _Meter(object):
+    """
+    Progress of one transfer.
+    Transfer loop only adds to written, and copies position and planned
+    (media seconds, see _SegmentData) of latest data on ticks;
+    rate, elapsed and ETA are updated by _MeterClock on its own timer.
+    """
+
+    __slots__ = (
+        'name', 'written', 'position', 'planned', 'rate', 'elapsed', 'eta',
+        '_started', '_sampled', '_sampled_written',
+    )
+
+    def __init__(self, name: str, now: float):
+        self.name = name
+        self.written = 0
+        self.position = self.planned = self.rate = self.eta = None
+        self.elapsed = 0.0
+        self._started = self._sampled = now
+        self._sampled_written = 0
+
+    def sample(self, now: float, alpha: float = PROGRESS_ALPHA):
+        """Folds rate since previous sample into exponential moving average."""
+        interval = now - self._sampled
+        if interval <= 0:
+            return
+        written = self.written
+        rate = (written - self._sampled_written) / interval
+        self.rate = rate if self.rate is None else (
+            alpha * rate + (1 - alpha) * self.rate
+        )
+        self.elapsed = now - self._started
+        self._sampled, self._sampled_written = now, written
+        # estimate total bytes from media seconds of planned HLS segments
+        planned, position = self.planned, self.position
+        if planned and position and self.rate:
+            remaining = written * (planned / position - 1)
+            self.eta = max(remaining, 0) / self.rate
+        else:
+            self.eta = None
+
+    def finish(self, now: float):
+        """Settles elapsed time and average rate of finished transfer."""
+        self.elapsed = now - self._started
+        if self.elapsed > 0:
+            self.rate = self.written / self.elapsed
+        self.eta = None
+
+    def snapshot(self) -> dict:
+        return {
+            "name": self.name, "written": self.written, "rate": self.rate or 0.0,
+            "elapsed": self.elapsed, "eta": self.eta,
+        }
+
+
+class _MeterClock(object):
+    """
+    Samples every meter on coarse timer thread, besides aggregate one,
+    so that transfer loops never read clock or compute rate.
+    ticks changes after each sample, readers may refresh their view then.
+    """
+
+    def __init__(
+            self,
+            interval: (int, float) = PROGRESS_INTERVAL,
+            alpha: float = PROGRESS_ALPHA,
+    ):
+        self.interval = interval
+        self.alpha = alpha
+        self.ticks = 0
+        self.meters = []
+        self.total = _Meter("total", time.monotonic())
+        self._finished = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def meter(self, name: str) -> _Meter:
+        meter = _Meter(name, time.monotonic())
+        with self._lock:
+            self.meters.append(meter)
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return meter
+
+    def done(self, meter: _Meter):
+        with self._lock:
+            meter.finish(time.monotonic())
+            self.meters.remove(meter)
+            self._finished += meter.written
+
+    def sample(self):
+        now = time.monotonic()
+        with self._lock:
+            for meter in self.meters:
+                meter.sample(now, self.alpha)
+            self.total.written = self._finished + sum(
+                meter.written for meter in self.meters
+            )
+            self.total.sample(now, self.alpha)
+        self.ticks += 1
+
+    def snapshot(self) -> dict:
+        """Progress of aggregate and every running transfer, to export."""
+        with self._lock:
+            return {
+                "total": self.total.snapshot(),
+                "jobs": [meter.snapshot() for meter in self.meters],
+            }
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+            self.sample()  # totals include transfers finished after last tick
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+
+def _format_progress(meter: _Meter) -> str:
+    """Formats progress of meter into a human readable format."""
+    text = "Written %s (%s @ %s/s)" % (
+        format_filesize(meter.written),
+        format_time(meter.elapsed),
+        format_filesize(meter.rate or 0),
+    )
+    if meter.eta is not None:
+        text += " ETA %s" % format_time(meter.eta)
+    return text
+
+
+def _make_console_progress(
+        clock: _MeterClock,
+        metrics: str = None,
+) -> typing.Callable:
+    """
+    Makes progress_iterator of _download, which writes progress to stderr
+    and snapshot of clock as json into metrics file, on every tick.
+    """
+
+    def progress(iterator, prefix):
+        meter = clock.meter(prefix)
+        seen = clock.ticks
+        try:
+            for data in iterator:
+                yield data
+                meter.written += len(data)
+                if clock.ticks != seen:
+                    seen = clock.ticks
+                    meter.position = getattr(data, "position", None)
+                    meter.planned = getattr(data, "planned", None)
+                    sys.stderr.write("\r[download] %s: %s " % (
+                        prefix, _format_progress(meter)
+                    ))
+                    sys.stderr.flush()
+                    if metrics:
+                        _write_metrics(clock, metrics)
+        finally:
+            clock.done(meter)
+            sys.stderr.write("\r[download] %s: %s\n" % (
+                prefix, _format_progress(meter)
+            ))
+            sys.stderr.flush()
+
+    return progress
+
+
+def _report_console(clock: _MeterClock, metrics: str = None):
+    """Writes aggregate progress of clock to stderr, and metrics if given."""
+    sys.stderr.write("\r[record] %d streams: %s " % (
+        len(clock.meters), _format_progress(clock.total)
+    ))
+    sys.stderr.flush()
+    if metrics:
+        _write_metrics(clock, metrics)
+
+
+def _write_metrics(clock: _MeterClock, filename: str):
+    with ctl.suppress(IOError, OSError):
+        with open(filename + ".tmp", "w") as file:
+            json.dump(clock.snapshot(), file)
+        os.replace(filename + ".tmp", filename)
+
+
+# Async engine
+
+_ASYNC_ERRORS = (IOError, EOFError, ValueError, asyncio.TimeoutError)
+
+
+class _AsyncEngine(object):
+    """
+    Records many streams on one event loop.
+    Takes the same (url, filename[, start[, end]]) jobs and output options
+    as _download and returns the same error messages, one for each job.
+    Blocking plugin resolution of streamlink runs in default executor,
+    and output of every stream (open, write, fsync at rotation, close)
+    in a shared pool of writer threads, so a slow sink stalls only its
+    own stream, unless as many sinks as writers are blocked at once.
+    Each stream awaits its write before next one, which keeps data in order.
+    Requests carry headers, cookies and ssl verification of streamlink session
+    and of each stream, and reuse idle connections per host (keep-alive).
+    Proxies are not supported.
+    With clock, each stream has its meter and report(clock) is called on ticks.
+    on_done(filename) is called on loop as soon as each stream is recorded.
+    """
+
+    def __init__(
+            self,
+            streamlink: Streamlink = None,
+            max_requests: int = ASYNC_MAX_REQUESTS,
+            queue_size: int = ASYNC_QUEUE_SIZE,
+            writers: int = ASYNC_WRITERS,
+            clock: _MeterClock = None,
+            report: typing.Callable = None,
+            on_done: typing.Callable = None,
+            **output_options
+    ):
+        self.streamlink = streamlink or Streamlink()
+        self.output_options = output_options
+        self.clock = clock
+        self.report = report
+        self.on_done = on_done
+        self.max_requests = max_requests
+        self.queue_size = queue_size
+        self.writers = writers
+        verify = self.streamlink.http.verify
+        self._ssl = ssl.create_default_context(
+            cafile=verify if isinstance(verify, str) else None
+        )
+        if verify is False:
+            self._ssl.check_hostname = False
+            self._ssl.verify_mode = ssl.CERT_NONE
+        self._attempts, self._reloads, _ = _retry_options(self.streamlink)
+        self._limit = self._sink = None
+        self._idle = {}  # (scheme, host, port): [(reader, writer)]
+
+    def run(self, jobs: typing.Iterable) -> list:
+        loop = asyncio.new_event_loop()
+        main = loop.create_task(self._run(jobs))
+        try:
+            return loop.run_until_complete(main)
+        except KeyboardInterrupt:
+            main.cancel()
+            with ctl.suppress(asyncio.CancelledError):
+                loop.run_until_complete(main)
+            raise
+        finally:
+            loop.run_until_complete(loop.shutdown_asyncgens())
+            loop.close()
+
+    async def _run(self, jobs):
+        self._limit = asyncio.Semaphore(self.max_requests)
+        self._sink = cf.ThreadPoolExecutor(max_workers=self.writers)
+        reporter = None
+        if self.clock is not None and self.report is not None:
+            reporter = asyncio.ensure_future(self._report())
+        try:
+            return await asyncio.gather(*map(self._record, jobs))
+        finally:
+            if reporter is not None:
+                reporter.cancel()
+            for _, writer in it.chain.from_iterable(self._idle.values()):
+                writer.close()
+            self._idle.clear()
+            # not waiting for a sink which is blocked forever
+            self._sink.shutdown(wait=False)
+
+    async def _report(self):
+        seen = self.clock.ticks
+        while True:
+            await asyncio.sleep(self.clock.interval)
+            if self.clock.ticks != seen:
+                seen = self.clock.ticks
+                self.report(self.clock)
+
+    async def _record(self, job):
+        try:
+            url, filename, start, end = _unpack_job(job)
+        except (TypeError, ValueError) as err:
+            return str(err)
+        loop = asyncio.get_event_loop()
+        name, stream, error = await loop.run_in_executor(
+            None, _resolve_stream, url, self.streamlink
+        )
+        if error:
+            return error
+        args = _request_args(stream)
+        if self.streamlink.http.proxies or args.get("proxies"):
+            return "Proxies are not supported by async engine, use sync engine"
+        if isinstance(stream, HLSStream):
+            source = self._hls_source(stream.url, start, end, args)
+        elif (
+                _needs_segments(**self.output_options) or
+                start is not None or end is not None
+        ):
+            return "Time range or rotating output requires HLS stream: {0}".format(url)
+        elif isinstance(stream, HTTPStream):
+            source = self._stream(stream.url, args)
+        else:
+            return "Unsupported stream type for async engine: {0}".format(
+                type(stream).__name__
+            )
+
+        error = await self._write(source, filename)
+        if not error and self.on_done is not None:
+            self.on_done(filename)
+        return error
+
+    async def _write(self, source, filename):
+        loop = asyncio.get_event_loop()
+        sink = self._sink
+        try:
+            output = await loop.run_in_executor(
+                sink, ft.partial(_open_output, filename, **self.output_options)
+            )
+        except (IOError, OSError, ValueError) as err:
+            return "Failed to open output: {0} ({1})".format(filename, err)
+        # fetcher stops at put() when writer is behind: per-stream backpressure
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        fetcher = asyncio.ensure_future(self._fetch(source, queue))
+        meter = None
+        if self.clock is not None:
+            meter = self.clock.meter(_output_name(filename))
+        written = 0
+        try:
+            while True:
+                item = await queue.get()
+                if item is None:
+                    break
+                try:
+                    if isinstance(item, Exception):
+                        raise item
+                    data = item if isinstance(item, bytes) else await item
+                except _ASYNC_ERRORS as err:
+                    return "Error when reading from stream: {0}, exiting".format(err)
+                try:
+                    await loop.run_in_executor(sink, output.write, data)
+                except IOError as err:
+                    return "Error when writing to output: {0}, exiting".format(err)
+                written += len(data)
+                if meter is not None:
+                    meter.written = written
+                    meter.position = getattr(data, "position", None)
+                    meter.planned = getattr(data, "planned", None)
+            if written:
+                try:
+                    await loop.run_in_executor(sink, _finish_output, output)
+                except (IOError, OSError) as err:
+                    return "Error when writing to output: {0}, exiting".format(err)
+        finally:
+            if meter is not None:
+                self.clock.done(meter)
+            fetcher.cancel()
+            while not queue.empty():
+                item = queue.get_nowait()
+                if isinstance(item, asyncio.Future):
+                    item.cancel()
+            with ctl.suppress(OSError):  # error, if any, is reported already
+                await loop.run_in_executor(sink, output.close)
+        if not written:
+            return "No data returned from stream"
+        return None
+
+    async def _fetch(self, source, queue):
+        try:
+            async for item in source:
+                await queue.put(item)
+        except _ASYNC_ERRORS as err:
+            await queue.put(err)
+        else:
+            await queue.put(None)
+
+    async def _hls_source(self, url, start=None, end=None, args=None):
+        last = planned = None
+        position = fetched = 0.0
+        while True:
+            text, base_url = await self._retry(self._reloads, url, args)
+            # segments are relative to playlist after redirects
+            playlist = _parse_playlist(text.decode("utf-8", "replace"), base_url)
+            fresh = _fresh_segments(playlist, last)
+            picked, position, finished = _clip_segments(
+                fresh, position, start, end
+            )
+            if last is None and playlist.endlist:
+                planned = sum(segment.duration for segment in picked)
+            if fresh:
+                last = fresh[-1].number
+            for segment in picked:
+                fetched += segment.duration
+                yield asyncio.ensure_future(
+                    self._get_segment(segment, fetched, planned, args)
+                )
+            if finished or playlist.endlist:
+                return
+            await asyncio.sleep(_reload_delay(playlist, fresh))
+
+    async def _get_segment(self, segment, position, planned, args=None):
+        data, _ = await self._retry(self._attempts, segment.uri, args)
+        return _SegmentData.of(data, segment, position, planned)
+
+    async def _retry(self, attempts, url, args=None):
+        """_get, up to attempts times while it fails."""
+        for attempt in range(1, attempts + 1):
+            try:
+                return await self._get(url, args)
+            except _ASYNC_ERRORS:
+                if attempt >= attempts:
+                    raise
+                await asyncio.sleep(HLS_RETRY_DELAY)
+
+    async def _get(self, url, args=None):
+        """Returns (whole body, final url after redirects)."""
+        async with self._limit:
+            response = await self._open(url, args)
+            return b"".join([data async for data in self._read(*response)]), response[-1]
+
+    async def _stream(self, url, args=None):
+        """Body of whole-file stream, which counts as a request while it lasts."""
+        async with self._limit:
+            async for data in self._body(url, args):
+                yield data
+
+    async def _body(self, url, args=None):
+        async for data in self._read(*await self._open(url, args)):
+            yield data
+
+    async def _read(self, reader, writer, headers, key, url):
+        complete = False
+        try:
+            if headers.get("transfer-encoding", "").lower() == "chunked":
+                while True:
+                    line = await self._wait(reader.readline())
+                    size = int(line.split(b";", 1)[0], 16)
+                    if not size:
+                        break
+                    yield await self._wait(reader.readexactly(size))
+                    await self._wait(reader.readline())
+                # trailer section, up to empty line
+                while await self._wait(reader.readline()) not in (b"\r\n", b"\n", b""):
+                    pass
+            else:
+                length = headers.get("content-length")
+                if length is None:  # body is delimited by closing connection
+                    key = None
+                remaining = int(length) if length is not None else None
+                while remaining is None or remaining > 0:
+                    data = await self._wait(reader.read(
+                        CHUNK_SIZE if remaining is None else min(CHUNK_SIZE, remaining)
+                    ))
+                    if not data:
+                        if remaining:
+                            raise IOError("Connection closed early: {0}".format(url))
+                        break
+                    if remaining is not None:
+                        remaining -= len(data)
+                    yield data
+            complete = True
+        finally:
+            if complete and key is not None:
+                self._idle.setdefault(key, []).append((reader, writer))
+            else:
+                writer.close()
+
+    def _prepare(self, url, args):
+        """Merges headers, cookies, ... of session and stream into request."""
+        return self.streamlink.http.prepare_request(requests.Request("GET", url, **{
+            key: value for key, value in (args or {}).items()
+            if key in ("headers", "params", "cookies", "auth")
+        }))
+
+    async def _send(self, key, message):
+        """
+        Sends request on idle connection to key, or on new connection
+        when there is none or server has closed it.
+        Returns (reader, writer, status line).
+        """
+        idle = self._idle.get(key)
+        while idle:
+            reader, writer = idle.pop()
+            try:
+                writer.write(message)
+                status_line = await self._wait(reader.readline())
+            except (IOError, EOFError):
+                status_line = b""
+            if status_line:
+                return reader, writer, status_line
+            writer.close()
+        reader, writer = await self._wait(asyncio.open_connection(
+            key[1], key[2], ssl=self._ssl if key[0] == "https" else None,
+        ))
+        writer.write(message)
+        return reader, writer, await self._wait(reader.readline())
+
+    async def _open(self, url, args=None, redirects=5):
+        """
+        Returns (reader, writer, headers, key, url) of successful response,
+        where key is None if connection can not be reused after body,
+        and url is final one after redirects.
+        """
+        for _ in range(redirects + 1):
+            request = self._prepare(url, args)
+            parts = urlparse.urlsplit(request.url)
+            secure = parts.scheme == "https"
+            key = (parts.scheme, parts.hostname, parts.port or (443 if secure else 80))
+            path = urlparse.urlunsplit(("", "", parts.path or "/", parts.query, ""))
+            lines = [
+                "GET {0} HTTP/1.1".format(path),
+                "Host: {0}".format(parts.netloc),
+                "Accept-Encoding: identity",
+            ]
+            lines.extend(
+                "{0}: {1}".format(*item) for item in request.headers.items()
+                if item[0].lower() not in ("accept-encoding", "connection", "host")
+            )
+            reader, writer, status_line = await self._send(
+                key, ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+            )
+            headers = {}
+            while True:
+                line = await self._wait(reader.readline())
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+            try:
+                status = int(status_line.split()[1])
+            except (IndexError, ValueError):
+                writer.close()
+                raise IOError("Invalid response from url: {0}".format(url))
+            if 300 <= status < 400 and "location" in headers:
+                writer.close()
+                url = urlparse.urljoin(request.url, headers["location"])
+                args = dict(args or {}, params=None)  # already in url
+                continue
+            if status != 200:
+                writer.close()
+                raise IOError("HTTP {0} from url: {1}".format(status, url))
+            if (
+                    headers.get("connection", "").lower() == "close" or
+                    status_line.startswith(b"HTTP/1.0") and
+                    headers.get("connection", "").lower() != "keep-alive"
+            ):
+                key = None
+            return reader, writer, headers, key, request.url
+        raise IOError("Too many redirects: {0}".format(url))
+
+    @staticmethod
+    def _wait(awaitable):
+        return asyncio.wait_for(awaitable, HTTP_TIMEOUT)
+
+
+# Post-processing
+
+def _exit_on_signal(signum, frame):
+    raise SystemExit(128 + signum)
+
+
+class _Command(object):
+    """
+    Post-processor which runs local command on downloaded file.
+    {input} and {name} (input without extension) in args are replaced.
+    Like every post-processor, it is called with filename in worker process
+    and returns error message, or None when succeeded.
+    """
+
+    def __init__(self, args: typing.Sequence):
+        self.args = tuple(args)
+
+    def __call__(self, filename: str) -> (str, None):
+        name = os.path.splitext(filename)[0]
+        args = [arg.format(input=filename, name=name) for arg in self.args]
+        # worker terminated on cancel exits through subprocess.run, killing command
+        signal.signal(signal.SIGTERM, _exit_on_signal)
+        try:
+            result = subprocess.run(
+                args, stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+            )
+        except OSError as err:
+            return "Failed to run {0}: {1}".format(args[0], err)
+        if result.returncode:
+            return "{0} exited with {1}: {2}".format(
+                args[0], result.returncode,
+                result.stderr.decode(errors="replace").strip()[-500:],
+            )
+        return None
+
+
+class _PostProcessStage(object):
+    """
+    Hands downloaded files to post-processor in a bounded process pool,
+    so that post-processing overlaps with remaining downloads.
+    """
+
+    def __init__(
+            self, processor: typing.Callable,
+            workers: int = POST_PROCESS_WORKERS,
+    ):
+        self.processor = processor
+        self.pool = cf.ProcessPoolExecutor(max_workers=workers)
+        self.pending = {}  # future: filename
+        self.errors = []  # (filename, error message)
+        self.submitted = self.finished = 0
+        self._lock = threading.Lock()  # parts may be submitted by writer threads
+
+    def submit(self, filename: str):
+        with self._lock:
+            self.pending[self.pool.submit(self.processor, filename)] = filename
+            self.submitted += 1
+
+    def poll(self, timeout: (int, float) = 0) -> bool:
+        """Collects finished results. Returns whether all are finished."""
+        with self._lock:
+            pending = list(self.pending)
+        done, _ = cf.wait(pending, timeout=timeout)
+        for future in done:
+            with self._lock:
+                filename = self.pending.pop(future)
+            self.finished += 1
+            if future.cancelled():
+                continue
+            try:
+                error = future.result()
+            except Exception as err:  # raised in worker process
+                error = "{0}: {1}".format(type(err).__name__, err)
+            if error:
+                self.errors.append((filename, str(error)))
+        return not self.pending
+
+    def status(self) -> str:
+        return "{0}/{1} processed{2}".format(
+            self.finished, self.submitted,
+            ", {0} failed".format(len(self.errors)) if self.errors else "",
+        )
+
+    def close(self, cancel: bool = False):
+        """
+        Waits for pending files, or with cancel, drops them and terminates
+        workers without waiting, so that caller (e.g. Tk loop) never blocks.
+        """
+        if not cancel:
+            self.pool.shutdown(wait=True)
+            self.poll()
+            return
+        for future in self.pending:
+            future.cancel()
+        # no public api to stop running workers before python 3.14
+        for process in list((getattr(self.pool, "_processes", None) or {}).values()):
+            with ctl.suppress(OSError):
+                process.terminate()
+        self.pool.shutdown(wait=False)
+        self.pending.clear()
+
+
 # Struct
 
 class Base(object):
@@ -338,13 +1992,16 @@ class Downloader(Base):
 
     _type = 1
     # method: __init__, __call__,
-    #         _setup, init_total, restore_total, update_total, handle_error, close,
-    #         make_iterator, format_filesize, format_time
+    #         _setup, init_total, restore_total, update_total, show_deduplicated,
+    #         update_post, wait_post, handle_error, close, make_iterator,
+    #         format_filesize, format_time
     # tk-related value:
     main = root = _total_pg = _total_text = _file_text = _progress_text = _bt = None
+    _post_text = None
     # user-defined value:
-    val_now = val_total = val_time = val_error = 0
-    now_exec = None
+    val_now = val_total = val_time = val_error = val_dedup = 0
+    now_exec = cache = stage = clock = None
+    post_processor = None  # POST_PROCESSOR unless set
 
     def __init__(self, rt):
         self.root = rt
@@ -361,26 +2018,50 @@ class Downloader(Base):
             if self.main:
                 self.main.destroy()
             # Initialize values
+            post_processor = self.post_processor or POST_PROCESSOR
+            if post_processor:
+                self.stage = _PostProcessStage(post_processor)
+            self.clock = _MeterClock()
             self._setup()
             self.init_total(iterable, length)
             session = Streamlink()
-            # Download each video
+            if self.cache is None and CACHE_DIR:
+                try:
+                    self.cache = _SegmentCache(os.path.expanduser(CACHE_DIR))
+                except OSError:  # run without cache
+                    self.cache = None
+            # Download each video, each stream only once
+            done = {}
             try:
-                for url, filename in iterable:
-                    res = _download(
-                        url, filename,
+                for url, filename, start, end in map(_unpack_job, iterable):
+                    res, source = _download_once(
+                        url, filename, done, start=start, end=end,
                         streamlink=session,
-                        progress_iterator=self.make_iterator
+                        progress_iterator=self.make_iterator,
+                        cache=self.cache,
                     )
+                    if source:
+                        self.show_deduplicated(filename, source)
                     self.update_total()
                     if res:
                         self.handle_error(res, filename)
                         break
+                    if self.stage:
+                        self.stage.submit(filename)
+                        self.update_post()
+                if self.stage:
+                    self.wait_post()
             except KeyboardInterrupt:
                 pass
             # Close
             return self.close()
         finally:
+            if self.stage:
+                self.stage.close(cancel=True)
+                self.stage = None
+            if self.clock:
+                self.clock.close()
+                self.clock = None
             self.now_exec = False
 
     def _setup(self, restore=False):
@@ -425,8 +2106,11 @@ class Downloader(Base):
         lb = tk.Label(main_popup, text="")
         lb.grid(row=3, column=2)
 
-        lb = tk.Label(main_popup, text="")
+        lb = tk.Label(main_popup, text="  Post:" if self.stage else "")
         lb.grid(row=4, column=0)
+        self._post_text = text = tk.StringVar()
+        lb = tk.Label(main_popup, textvariable=text)
+        lb.grid(row=4, column=1)
 
         self._bt = bt = tk.Button(
             main_popup, text="Terminate", width=15,
@@ -440,7 +2124,7 @@ class Downloader(Base):
         main_popup.update()
 
     def init_total(self, iterable, length=None):
-        self.val_time = self.val_now = self.val_error = 0
+        self.val_time = self.val_now = self.val_error = self.val_dedup = 0
         try:
             self.val_total = length or len(iterable)
             self._total_text.set(format("0/{0}".format(self.val_total), "^9"))
@@ -459,6 +2143,38 @@ class Downloader(Base):
         else:
             self._total_text.set(format("{0}".format(self.val_now), "^9"))
 
+    def show_deduplicated(self, filename, source):
+        self.val_dedup += 1
+        self._file_text.set(os.path.basename(filename))
+        self._progress_text.set(
+            "Deduplicated: same stream as %s" % os.path.basename(source)
+        )
+        self.main.update()
+
+    def update_post(self):
+        self.stage.poll()
+        self._post_text.set(self.stage.status())
+
+    def wait_post(self):
+        self._file_text.set("Waiting for post-processing...")
+        self._progress_text.set("-")
+        while not self.stage.poll(timeout=0.1):
+            self._post_text.set(self.stage.status())
+            try:
+                self.main.update()
+            except tk.TclError:  # popup closed
+                self._setup(restore=True)
+                self.update_total(restore=True)
+                self.terminate()
+            if self.val_error == 130:
+                raise KeyboardInterrupt
+        self._post_text.set(self.stage.status())
+        if self.stage.errors:
+            self.handle_error("\n".join(
+                "{0}: {1}".format(os.path.basename(filename), error)
+                for filename, error in self.stage.errors
+            ), "post-processing")
+
     def handle_error(self, error_message, filename=None):
         tkm.showerror(
             "Error: {filename}".format(filename=filename or ""),
@@ -480,60 +2196,56 @@ class Downloader(Base):
             close_text = 'Terminated by user'
         else:
             close_text = 'unknown exit code'
+        if self.val_dedup:
+            close_text += ' ({0} deduplicated)'.format(self.val_dedup)
         self._file_text.set(close_text)
-        self._progress_text.set('Execution time: {0}'.format(
-            format_time(self.val_time)
-        ))
+        close_text = 'Execution time: {0}'.format(format_time(self.val_time))
+        if self.cache is not None and self.cache.hits:
+            close_text += ' ({0} from cache)'.format(
+                format_filesize(self.cache.hit_bytes)
+            )
+        self._progress_text.set(close_text)
         self._bt.destroy()
         bt = tk.Button(self.main, text="Close", width=15, command=self.main.destroy)
         bt.grid(row=5, column=1)
         self.main.update()
         self.val_now = self.val_total = self.val_time = self.val_error = 0
+        self.val_dedup = 0
         return code
 
     def make_iterator(self, iterator, prefix):
-        speed_updated = start = now = time.time()
-        speed_written = written = 0
-        speed_history = col.deque(maxlen=5)
-
-        for data in iterator:
-            yield data
-
-            now = time.time()
-            elapsed = now - start
-            written += len(data)
+        clock = self.clock
+        meter = clock.meter(prefix)
+        seen = clock.ticks
 
-            speed_elapsed = now - speed_updated
-            if speed_elapsed >= 0.5:
-                speed_history.appendleft((
-                    written - speed_written,
-                    speed_updated,
-                ))
-                speed_updated = now
-                speed_written = written
-
-                speed_history_written = sum(h[0] for h in speed_history)
-                speed_history_elapsed = now - speed_history[-1][1]
-                speed = speed_history_written / speed_history_elapsed
-                self._file_text.set(prefix)  # added
-                self._progress_text.set(  # edited
-                    "Written %s (%s @ %s/s)" % (
-                        format_filesize(written),
-                        format_time(elapsed),
-                        format_filesize(speed),
-                    )
-                )
-                # added
-                try:
-                    self.main.title("Download - %s" % prefix)
-                except tk.TclError:
-                    self._setup(restore=True)
-                    self.update_total(restore=True)
-                    self.terminate()
-                if self.val_error == 130:
-                    raise KeyboardInterrupt
-                self.main.update()
-        self.val_time += now - start
+        try:
+            for data in iterator:
+                yield data
+                meter.written += len(data)
+
+                if clock.ticks != seen:
+                    seen = clock.ticks
+                    meter.position = getattr(data, "position", None)
+                    meter.planned = getattr(data, "planned", None)
+                    self._file_text.set(prefix)  # added
+                    if self.stage:
+                        self.update_post()
+                    self._progress_text.set(_format_progress(meter))  # edited
+                    # added
+                    try:
+                        self.main.title("Download - %s (%s/s total)" % (
+                            prefix, format_filesize(clock.total.rate or 0)
+                        ))
+                    except tk.TclError:
+                        self._setup(restore=True)
+                        self.update_total(restore=True)
+                        self.terminate()
+                    if self.val_error == 130:
+                        raise KeyboardInterrupt
+                    self.main.update()
+        finally:
+            clock.done(meter)
+            self.val_time += meter.elapsed
 
 
 class TreeView(Base):
@@ -541,8 +2253,8 @@ class TreeView(Base):
 
     _type = 1
     # method: __init__, __bool__, __len__, __iter__,
-    #         _setup, remove_selected, remove_all, get_selection_iter, get_all_iter,
-    #         add,
+    #         _setup, remove_selected, remove_all, remove_iids,
+    #         get_selection_iter, get_all_iter, get_items_iter, add,
     # tk-related value:
     root = frame = tree = None
 
@@ -555,26 +2267,32 @@ class TreeView(Base):
     def _setup(self):
         self.tree = treeview = ttk.Treeview(
             self.frame,
-            columns=['url', 'filename'],
-            displaycolumns=['url', 'filename'],
+            columns=['url', 'filename', 'start', 'end'],
+            displaycolumns=['url', 'filename', 'start', 'end'],
             height=12
         )
         treeview.pack(side='left')
         treeview.column("#0", width=100,)
         treeview.heading("#0", text="filename")
-        treeview.column("url", width=240, anchor='w')
+        treeview.column("url", width=200, anchor='w')
         treeview.heading("url", text="url")
-        treeview.column("filename", width=240, anchor='w')
+        treeview.column("filename", width=200, anchor='w')
         treeview.heading("filename", text="directory")
+        treeview.column("start", width=60, anchor='w')
+        treeview.heading("start", text="start")
+        treeview.column("end", width=60, anchor='w')
+        treeview.heading("end", text="end")
         vsb = ttk.Scrollbar(self.frame, orient="vertical", command=treeview.yview)
         vsb.pack(side='right', fill='y')
         treeview.configure(yscrollcommand=vsb.set)
 
-    def add(self, url, filename):
+    def add(self, url, filename, start=None, end=None):
         if len(self.tree.get_children()) <= MAX_VIDEO:
             abspath = os.path.abspath(filename)
             name = os.path.split(abspath)[1]
-            self.tree.insert('', 'end', text=name, values=(url, abspath))
+            self.tree.insert('', 'end', text=name, values=(
+                url, abspath, format_offset(start), format_offset(end)
+            ))
         else:
             tkm.showerror(
                 "Error: cannot add video", "You can add video upto {0} videos."
@@ -587,6 +2305,10 @@ class TreeView(Base):
     def remove_all(self):
         self.tree.delete(*(iid for iid in self.tree.get_children()))
 
+    def remove_iids(self, iids):
+        # rows may be removed by user meanwhile
+        self.tree.delete(*(iid for iid in iids if self.tree.exists(iid)))
+
     def __bool__(self):
         return True if self.tree.get_children() else False
 
@@ -596,29 +2318,42 @@ class TreeView(Base):
     def __iter__(self):
         for iid in self.tree.get_children():
             item = self.tree.set(iid)
-            yield item['url'], item['filename']
+            yield _unpack_job((
+                item['url'], item['filename'], item['start'], item['end']
+            ))
 
     def get_selected_iter(self):
         for iid in self.tree.selection():
             item = self.tree.set(iid)
-            yield item['url'], item['filename']
+            yield _unpack_job((
+                item['url'], item['filename'], item['start'], item['end']
+            ))
 
     def get_all_iter(self):
         return iter(self)
 
+    def get_items_iter(self):
+        for iid in self.tree.get_children():
+            item = self.tree.set(iid)
+            yield iid, _unpack_job((
+                item['url'], item['filename'], item['start'], item['end']
+            ))
+
 
 class ButtonFrameMaker(Base):
     """makes button frame"""
 
     _type = 2
     # tk-related value:
-    root = frame = treeview = downloader = url_entry = None
+    root = frame = treeview = downloader = url_entry = start_entry = end_entry = None
+    buttons = ()
 
     def __init__(self, rt, **params):
         assert 'treeview' in params and 'downloader' in params
         self.root = rt
         self.treeview = params.get('treeview')
         self.downloader = params.get('downloader')
+        self.buttons = []
         self.frame = button_frame = tk.Frame(rt)
         button_frame.grid(row=1)
         self._setup()
@@ -636,30 +2371,48 @@ class ButtonFrameMaker(Base):
             command=self._make_add_func()
         )
         w.grid(row=1, column=3)
+        self.buttons.append(w)
+        w = tk.Label(button_frame, text="구간 (시작, 끝) : ", width=15)
+        w.grid(row=2, column=0)
+        self.start_entry = e = tk.Entry(button_frame, width=15)
+        e.grid(row=2, column=1)
+        self.end_entry = e = tk.Entry(button_frame, width=15)
+        e.grid(row=2, column=2)
+        w = tk.Label(button_frame, text="(h:mm:ss, 비우면 전체)")
+        w.grid(row=2, column=3)
         w = tk.Label(button_frame, text="")
-        w.grid(row=2, column=0, columnspan=4)
+        w.grid(row=3, column=0, columnspan=4)
         w = tk.Button(
             button_frame, text="선택 제거", width=15,
             command=self.treeview.remove_selected
         )
-        w.grid(row=3, column=0)
+        w.grid(row=4, column=0)
+        self.buttons.append(w)
         w = tk.Button(
             button_frame, text="전체 제거", width=15,
             command=self.treeview.remove_all
         )
-        w.grid(row=3, column=1)
+        w.grid(row=4, column=1)
+        self.buttons.append(w)
         w = tk.Button(
             button_frame, text="선택 저장", width=15,
             command=self._make_save_selected_func()
         )
-        w.grid(row=3, column=2)
+        w.grid(row=4, column=2)
+        self.buttons.append(w)
         w = tk.Button(
             button_frame, text="전체 저장", width=15,
             command=self._make_save_all_func()
         )
-        w.grid(row=3, column=3)
+        w.grid(row=4, column=3)
+        self.buttons.append(w)
         w = tk.Label(button_frame, text="\n")
-        w.grid(row=4, column=0, columnspan=4)
+        w.grid(row=5, column=0, columnspan=4)
+
+    def set_busy(self, busy: bool):
+        """Disables buttons while other work (e.g. probe) uses the list."""
+        for button in self.buttons:
+            button.configure(state=tk.DISABLED if busy else tk.NORMAL)
 
     def _make_add_func(self):
 
@@ -668,10 +2421,19 @@ class ButtonFrameMaker(Base):
             if not url:
                 tkm.showwarning("No URL", "Enter URL first.")
                 return
+            try:
+                _, _, start, end = _unpack_job(
+                    (url, "", self.start_entry.get(), self.end_entry.get())
+                )
+            except ValueError as e:
+                tkm.showerror("Error: invalid range!", str(e))
+                return
             filename = _ask_new_file()
             if filename:
-                self.treeview.add(url=url, filename=filename)
+                self.treeview.add(url=url, filename=filename, start=start, end=end)
                 self.url_entry.delete(0, tk.END)
+                self.start_entry.delete(0, tk.END)
+                self.end_entry.delete(0, tk.END)
 
         return command
 
@@ -705,14 +2467,27 @@ class MenuMaker(Base):
 
     _type = 2
     # tk-related value:
-    root = treeview = None
+    root = treeview = buttonframe = downloader = menu = None
+    # user-defined value:
+    probing = False
+    # entries which must not run while probe updates window
+    busy_labels = ('영상 목록 불러오기', '영상 목록 점검', '종료')
 
     def __init__(self, rt, **params):
         assert 'treeview' in params
         self.root = rt
         self.treeview = params['treeview']
+        self.buttonframe = params.get('BUTTONFRAMEMAKER')
+        self.downloader = params.get('downloader')
         self._setup()
 
+    def set_busy(self, busy: bool):
+        state = tk.DISABLED if busy else tk.NORMAL
+        for label in self.busy_labels:
+            self.menu.entryconfigure(label, state=state)
+        if self.buttonframe is not None:
+            self.buttonframe.set_busy(busy)
+
     def _setup(self):
         rt = self.root
 
@@ -722,7 +2497,7 @@ class MenuMaker(Base):
 
         menubar = tk.Menu(rt)
 
-        menu_1 = tk.Menu(menubar, tearoff=0)
+        self.menu = menu_1 = tk.Menu(menubar, tearoff=0)
         menu_1.add_command(
             label='영상 목록 저장',
             command=self._make_save_list_func()
@@ -731,6 +2506,10 @@ class MenuMaker(Base):
             label='영상 목록 불러오기',
             command=self._make_load_list_func()
         )
+        menu_1.add_command(
+            label='영상 목록 점검',
+            command=self._make_probe_func()
+        )
         menu_1.add_separator()
         menu_1.add_command(
             label='종료',
@@ -751,6 +2530,71 @@ class MenuMaker(Base):
 
         rt.config(menu=menubar)
 
+    def _make_probe_func(self):
+
+        def show_table(iids, results):
+            popup = tk.Toplevel(self.root)
+            popup.title("Probe - {0}/{1} ok".format(
+                sum(not result.error for result in results), len(results)
+            ))
+            table = ttk.Treeview(
+                popup,
+                columns=['plugin', 'variant', 'type', 'result'],
+                height=min(max(len(results), 1), 20)
+            )
+            table.grid(row=0, column=0, columnspan=2)
+            table.column("#0", width=140)
+            table.heading("#0", text="filename")
+            for column, width in (
+                    ("plugin", 80), ("variant", 80), ("type", 90), ("result", 320)
+            ):
+                table.column(column, width=width, anchor='w')
+                table.heading(column, text=column)
+            for result in results:
+                table.insert('', 'end', text=_output_name(result.filename), values=(
+                    result.plugin or "-", result.variant or "-",
+                    result.kind or "-", result.error or "ok",
+                ))
+            failed = [iid for iid, result in zip(iids, results) if result.error]
+
+            def remove_failed():
+                self.treeview.remove_iids(failed)
+                popup.destroy()
+
+            w = tk.Button(
+                popup, text="실패 항목 제거", width=15, command=remove_failed,
+                state=tk.NORMAL if failed else tk.DISABLED
+            )
+            w.grid(row=1, column=0)
+            w = tk.Button(popup, text="Close", width=15, command=popup.destroy)
+            w.grid(row=1, column=1)
+
+        def command():
+            if self.probing:
+                tkm.showwarning("Probing", "Probe is already running.")
+                return
+            if self.downloader is not None and self.downloader.now_exec:
+                tkm.showwarning("Downloading", "Cannot probe while downloading.")
+                return
+            if not self.treeview:
+                tkm.showwarning("No video", "Add any video!")
+                return
+            # rows are identified by iid, as list may change while probing
+            iids, jobs = zip(*self.treeview.get_items_iter())
+            self.probing = True
+            self.set_busy(True)
+            try:
+                with cf.ThreadPoolExecutor(max_workers=1) as pool:
+                    future = pool.submit(_probe_all, jobs)
+                    while not cf.wait([future], timeout=0.1).done:
+                        self.root.update()  # keep window alive while probing
+            finally:
+                self.probing = False
+                self.set_busy(False)
+            show_table(iids, future.result())
+
+        return command
+
     def _make_load_list_func(self):
 
         def ask_new_file_error(filename, error=None):
@@ -787,8 +2631,9 @@ class MenuMaker(Base):
                     tkm.showerror("Error: cannot open file!", str(e))
                     return
             for index in range(len(data)):
-                item = data[index]
-                if len(item) != 2:
+                try:
+                    item = data[index] = list(_unpack_job(data[index]))
+                except (TypeError, ValueError):
                     tkm.showerror(
                         "Error: invalid data!",
                         "Data format is invalid."
@@ -805,7 +2650,7 @@ class MenuMaker(Base):
                         new_filename = _ask_new_file()
                         if not new_filename:
                             return
-                        data[index] = [item[0], new_filename]
+                        data[index] = [item[0], new_filename] + item[2:]
                         continue
                 else:
                     try:
@@ -818,7 +2663,7 @@ class MenuMaker(Base):
                             new_filename = ask_new_file_error(filename, e)
                             if not new_filename:
                                 return
-                            data[index] = [item[0], new_filename]
+                            data[index] = [item[0], new_filename] + item[2:]
                             continue
                         else:
                             try:
@@ -827,7 +2672,7 @@ class MenuMaker(Base):
                                 new_filename = ask_new_file_error(filename, e)
                                 if not new_filename:
                                     return
-                                data[index] = [item[0], new_filename]
+                                data[index] = [item[0], new_filename] + item[2:]
                                 continue
                             else:
                                 new_temp_file.close()
@@ -841,19 +2686,19 @@ class MenuMaker(Base):
                                         filename, new_filename
                                     )
                                 ):
-                                    data[index] = [item[0], new_filename]
+                                    data[index] = [item[0], new_filename] + item[2:]
                                 else:
                                     new_filename = _ask_new_file()
                                     if not new_filename:
                                         return
-                                    data[index] = [item[0], new_filename]
+                                    data[index] = [item[0], new_filename] + item[2:]
                                     continue
                     else:
                         temp_file.close()
                         os.remove(filename)
             self.treeview.remove_all()
-            for url, filename in data:
-                self.treeview.add(url, filename)
+            for url, filename, start, end in data:
+                self.treeview.add(url, filename, start, end)
 
         return command
 
@@ -873,7 +2718,12 @@ class MenuMaker(Base):
                     filename += '.json'
                 with open(filename, 'w') as file:
                     file.write(json.dumps(list(map(
-                        lambda obj: (obj[0], '/'.join(obj[1].split('\\'))),
+                        lambda obj: (
+                            (obj[0], '/'.join(obj[1].split('\\'))) +
+                            (tuple(map(format_offset, obj[2:])) if any(
+                                offset is not None for offset in obj[2:]
+                            ) else ())  # range only when set
+                        ),
                         self.treeview)  # update filename for linux format
                     )))
 
@@ -886,6 +2736,43 @@ def build() -> Root:
     return Root(Downloader, TreeView, ButtonFrameMaker, MenuMaker)
 
 
+def _main(argv: typing.Sequence) -> int:
+    """Headless usage, which can stream into other tools without file."""
+    import argparse
+    parser = argparse.ArgumentParser(description=ROOT_TITLE)
+    parser.add_argument("url")
+    parser.add_argument(
+        "output",
+        help="file path, \"{0}\" for stdout or \"{1}PATH\" for named pipe"
+        .format(STDOUT, PIPE_PREFIX)
+    )
+    parser.add_argument("--start", help="seconds or h:mm:ss (HLS only)")
+    parser.add_argument("--end", help="seconds or h:mm:ss (HLS only)")
+    parser.add_argument("--engine", choices=("sync", "async"), default="sync")
+    parser.add_argument("--max-duration", type=float, help="rotate output (seconds)")
+    parser.add_argument("--max-size", type=int, help="rotate output (bytes)")
+    parser.add_argument("--hash", action="append", dest="hashes", help="e.g. sha256")
+    parser.add_argument("--check-ts", action="store_true")
+    parser.add_argument("--probe", action="store_true", help="only check url")
+    parser.add_argument("--metrics", help="json file of progress, kept updated")
+    args = parser.parse_args(argv)
+    try:
+        job = _unpack_job((args.url, args.output, args.start, args.end))
+    except ValueError as e:
+        parser.error(str(e))
+    if args.probe:
+        return probe([job])
+    options = {
+        key: value for key, value in (
+            ("max_duration", args.max_duration), ("max_size", args.max_size),
+            ("hashes", args.hashes), ("check_ts", args.check_ts),
+        ) if value
+    }
+    return download([job], engine=args.engine, metrics=args.metrics, **options)
+
+
 if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        sys.exit(_main(sys.argv[1:]))
     build()()
 
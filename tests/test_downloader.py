@@ -0,0 +1,617 @@
+import io
+import os
+import sys
+import json
+import contextlib
+import time
+import asyncio
+import hashlib
+import threading
+import http.server
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import downloader  # noqa: E402
+
+
+PLAYLIST = """#EXTM3U
+#EXT-X-TARGETDURATION:4
+#EXT-X-MEDIA-SEQUENCE:10
+#EXTINF:4.0,
+a.ts
+#EXTINF:4.0,
+sub/b.ts
+#EXTINF:2.5,
+http://cdn.example.com/c.ts
+#EXT-X-ENDLIST
+"""
+
+BODY = bytes(range(256)) * 100
+SEGMENTS = [bytes([index]) * 1000 for index in range(6)]
+MEDIA_PLAYLIST = "#EXTM3U\n#EXT-X-TARGETDURATION:2\n" + "".join(
+    "#EXTINF:2.0,\nseg{0}.ts\n".format(index) for index in range(len(SEGMENTS))
+) + "#EXT-X-ENDLIST\n"
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # segment requests of current test, and most of them served at once
+    lock = threading.Lock()
+    requested = []
+    active = peak = 0
+    failures = {}  # path: times to fail before serving
+
+    def _send_body(self, body):
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_HEAD(self):
+        if self.path.startswith("/hls/seg"):
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(self._segment())))
+            self.end_headers()
+        else:
+            self.send_error(405)
+
+    def _segment(self):
+        return SEGMENTS[int(self.path[len("/hls/seg"):-len(".ts")])]
+
+    def do_GET(self):
+        if self.path == "/index.m3u8":
+            self.send_response(302)
+            self.send_header("Location", "/hls/index.m3u8")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+        elif self.path == "/hls/index.m3u8":
+            self._send_body(MEDIA_PLAYLIST.encode())
+        elif self.path.startswith("/hls/seg"):
+            cls = type(self)
+            if cls.failures.get(self.path):
+                cls.failures[self.path] -= 1
+                self.send_error(500)
+                return
+            with cls.lock:
+                cls.requested.append(self.path)
+                cls.active += 1
+                cls.peak = max(cls.peak, cls.active)
+            time.sleep(0.02)
+            with cls.lock:
+                cls.active -= 1
+            self._send_body(self._segment())
+        elif self.path == "/length":
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(BODY)))
+            self.end_headers()
+            self.wfile.write(BODY)
+        elif self.path == "/chunked":
+            self.send_response(200)
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for start in range(0, len(BODY), 7000):
+                chunk = BODY[start:start + 7000]
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+            self.wfile.write(b"0\r\n\r\n")
+        elif self.path == "/redirect":
+            self.send_response(302)
+            self.send_header("Location", "/length")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+        elif self.path == "/echo":
+            body = json.dumps(dict(self.headers)).encode()
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        else:
+            self.send_error(404)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope="module")
+def server():
+    httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield "http://127.0.0.1:{0}".format(httpd.server_port)
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def _segment(number, duration):
+    return downloader._Segment(number, "s{0}.ts".format(number), duration, 0.0)
+
+
+def test_parse_playlist():
+    playlist = downloader._parse_playlist(PLAYLIST, "http://host/live/index.m3u8")
+    assert playlist.target_duration == 4.0
+    assert playlist.endlist
+    assert playlist.unsupported is None
+    assert [segment.number for segment in playlist.segments] == [10, 11, 12]
+    assert [segment.uri for segment in playlist.segments] == [
+        "http://host/live/a.ts",
+        "http://host/live/sub/b.ts",
+        "http://cdn.example.com/c.ts",
+    ]
+    assert [segment.offset for segment in playlist.segments] == [0.0, 4.0, 8.0]
+
+
+@pytest.mark.parametrize("tag, reason", [
+    ("#EXT-X-KEY:METHOD=AES-128,URI=\"key\"", "encrypted segments"),
+    ("#EXT-X-MAP:URI=\"init.mp4\"", "EXT-X-MAP tag"),
+    ("#EXT-X-STREAM-INF:BANDWIDTH=1", "variant playlist"),
+])
+def test_parse_playlist_unsupported(tag, reason):
+    playlist = downloader._parse_playlist(tag + "\n" + PLAYLIST, "http://host/")
+    assert playlist.unsupported == reason
+    with pytest.raises(downloader._UnsupportedPlaylist):
+        downloader._fresh_segments(playlist, None)
+
+
+def test_clip_segments():
+    fresh = [_segment(number, 4.0) for number in range(5)]
+    picked, position, finished = downloader._clip_segments(fresh, 0.0, 5.0, 11.0)
+    assert [segment.number for segment in picked] == [1, 2]
+    assert finished
+    # whole window, continuing from position of previous reload
+    picked, position, finished = downloader._clip_segments(fresh[:2], 8.0)
+    assert len(picked) == 2 and position == 16.0 and not finished
+
+
+@pytest.mark.parametrize("offset, text", [
+    (None, ""), (0, "0:00:00"), (62.5, "0:01:02.5"),
+    (59.9996, "0:01:00"), (3599.9999, "1:00:00"),
+])
+def test_format_offset(offset, text):
+    assert downloader.format_offset(offset) == text
+    if offset is not None:
+        assert downloader._parse_time(text) == pytest.approx(offset, abs=1e-3)
+
+
+def test_hashing_writer_manifest(tmp_path):
+    filename = str(tmp_path / "out.ts")
+    packet = bytes([downloader.TS_SYNC_BYTE]) + bytes(downloader.TS_PACKET_SIZE - 1)
+    data = downloader._SegmentData.of(packet * 10, _segment(0, 2.0))
+    output = downloader._open_output(filename, hashes=["sha256"], check_ts=True)
+    output.write(data[:100])  # chunk across packet boundary
+    output.write(data[100:])
+    output.write(data)
+    output.finish()
+    output.close()
+    with open(filename + downloader.MANIFEST_SUFFIX) as file:
+        manifest = json.load(file)
+    assert manifest["complete"]
+    assert manifest["bytes"] == len(data) * 2
+    assert manifest["segments"] == 1
+    assert manifest["hashes"]["sha256"] == hashlib.sha256(bytes(data) * 2).hexdigest()
+    assert manifest["ts_sync"] == {"packets": 20, "errors": 0}
+
+
+def test_hashing_writer_removes_stale_manifest(tmp_path):
+    filename = str(tmp_path / "out.ts")
+    with open(filename + downloader.MANIFEST_SUFFIX, "w") as file:
+        file.write("{}")
+    output = downloader._open_output(filename, hashes=["md5"])
+    output.write(b"partial")
+    output.close()  # not finished
+    assert not os.path.exists(filename + downloader.MANIFEST_SUFFIX)
+
+
+def _manifest(filename):
+    with open(filename + downloader.MANIFEST_SUFFIX) as file:
+        return json.load(file)
+
+
+def test_download_hashes_keep_streamlink_reader(server, tmp_path):
+    filename = str(tmp_path / "out.ts")
+    _reset_handler()
+    assert downloader._download(
+        "hls://" + server + "/index.m3u8", filename, hashes=["sha256"]
+    ) is None
+    manifest = _manifest(filename)
+    # read by streamlink, so segments are not counted
+    assert manifest["complete"] and manifest["segments"] is None
+    assert manifest["hashes"]["sha256"] == hashlib.sha256(b"".join(SEGMENTS)).hexdigest()
+    # time range is fetched by segments, which are counted
+    assert downloader._download(
+        "hls://" + server + "/index.m3u8", filename, start=2, end=6, hashes=["md5"]
+    ) is None
+    assert _manifest(filename)["segments"] == 2
+
+
+def test_rotated_parts_hashed_separately(tmp_path):
+    filename = str(tmp_path / "out.ts")
+    output = downloader._open_output(filename, max_duration=4, hashes=["sha256"])
+    segments = [
+        downloader._SegmentData.of(bytes([index]) * 1000, _segment(index, 2.0))
+        for index in range(5)
+    ]
+    for data in segments:
+        output.write(data)
+    output.finish()
+    output.close()
+    with open(filename + downloader.MANIFEST_SUFFIX) as file:
+        manifest = json.load(file)
+    assert manifest["complete"]
+    assert [part["part"] for part in manifest["parts"]] == [
+        "out.001.ts", "out.002.ts", "out.003.ts",
+    ]
+    assert [part["segments"] for part in manifest["parts"]] == [2, 2, 1]
+    for part in manifest["parts"]:
+        with open(str(tmp_path / part["part"]), "rb") as file:
+            assert hashlib.sha256(file.read()).hexdigest() == part["hashes"]["sha256"]
+        assert os.path.exists(str(tmp_path / part["part"]) + downloader.MANIFEST_SUFFIX)
+
+
+def test_segment_cache(tmp_path):
+    cache = downloader._SegmentCache(str(tmp_path / "cache"), max_size=250)
+    for name in "abc":
+        cache.put(name, name.encode() * 100)
+    # 300 bytes exceed max_size: least recently used "a" is evicted
+    assert cache.get("a", 100) is None
+    assert cache.get("b", 100) == b"b" * 100
+    assert cache.get("b", 99) is None  # keyed by length too
+    stats = cache.stats()
+    assert stats["entries"] == 2 and stats["size"] == 200
+    assert stats["hits"] == 1 and stats["misses"] == 2
+    assert stats["evictions"] == 1 and stats["evicted_bytes"] == 100
+
+    filename = str(tmp_path / "joined.ts")
+    assert cache.assemble([("b", 100), ("c", 100)], filename) == 200
+    with open(filename, "rb") as file:
+        assert file.read() == b"b" * 100 + b"c" * 100
+    with pytest.raises(KeyError):
+        cache.assemble([("b", 100), ("a", 100)], filename)
+
+    # entries are found again by a new cache on the same directory
+    assert downloader._SegmentCache(str(tmp_path / "cache")).stats()["entries"] == 2
+
+
+def test_download_through_cache(server, tmp_path):
+    cache = downloader._SegmentCache(str(tmp_path / "cache"))
+    for name in ("first.ts", "second.ts"):
+        assert downloader._download(
+            "hls://" + server + "/index.m3u8", str(tmp_path / name), cache=cache
+        ) is None
+        with open(str(tmp_path / name), "rb") as file:
+            assert file.read() == b"".join(SEGMENTS)
+    assert cache.hits == len(SEGMENTS) and cache.misses == len(SEGMENTS)
+
+
+def _read(path):
+    with open(str(path), "rb") as file:
+        return file.read()
+
+
+def test_replicated_output_not_overwritten(server, tmp_path):
+    first, second = str(tmp_path / "a.ts"), str(tmp_path / "b.ts")
+    assert downloader._download("hls://" + server + "/index.m3u8", first) is None
+    assert downloader._replicate(first, second) is None
+    assert _read(second) == b"".join(SEGMENTS)
+    # rewriting one of linked outputs leaves the other one
+    assert downloader._download("httpstream://" + server + "/length", second) is None
+    assert _read(first) == b"".join(SEGMENTS) and _read(second) == BODY
+
+
+def test_download_once_deduplicates(server, tmp_path):
+    streamlink = downloader.Streamlink()
+    playlist = "hls://" + server + "/index.m3u8"
+    done = {}
+    a, b, c = (str(tmp_path / name) for name in ("a.ts", "b.ts", "c.ts"))
+    assert downloader._download_once(playlist, a, done, streamlink) == (None, None)
+    _reset_handler()
+    assert downloader._download_once(playlist, b, done, streamlink) == (None, a)
+    assert _Handler.requested == [] and _read(b) == _read(a)
+    # a is rewritten with other stream: playlist is fetched again, not copied
+    assert downloader._download_once(
+        "httpstream://" + server + "/length", a, done, streamlink
+    ) == (None, None)
+    _reset_handler()
+    assert downloader._download_once(playlist, c, done, streamlink) == (None, None)
+    assert len(_Handler.requested) == len(SEGMENTS)
+    assert _read(c) == _read(b) == b"".join(SEGMENTS) and _read(a) == BODY
+
+
+@pytest.fixture
+def no_retry_delay(monkeypatch):
+    monkeypatch.setattr(downloader, "HLS_RETRY_DELAY", 0)
+
+
+def test_iter_hls_retries_segment(server, no_retry_delay):
+    streamlink = downloader.Streamlink()
+    _reset_handler(**{"seg2.ts": 2})
+    data = list(downloader._iter_hls(streamlink, server + "/index.m3u8"))
+    assert data == SEGMENTS
+    _reset_handler(**{"seg2.ts": 3})  # default attempts are 3
+    with pytest.raises(IOError):
+        list(downloader._iter_hls(streamlink, server + "/index.m3u8"))
+
+
+def test_async_run_retries_segment(server, tmp_path, no_retry_delay):
+    filename = str(tmp_path / "out.ts")
+    _reset_handler(**{"seg2.ts": 2})
+    engine = downloader._AsyncEngine()
+    assert engine.run([("hls://" + server + "/index.m3u8", filename)]) == [None]
+    with open(filename, "rb") as file:
+        assert file.read() == b"".join(SEGMENTS)
+
+
+def _read_body(engine, url, args=None):
+    async def read():
+        return b"".join([data async for data in engine._body(url, args)])
+    return asyncio.run(read())
+
+
+@pytest.mark.parametrize("path", ["/length", "/chunked", "/redirect"])
+def test_async_body(server, path):
+    engine = downloader._AsyncEngine()
+    assert _read_body(engine, server + path) == BODY
+
+
+def test_async_body_reuses_connection(server):
+    engine = downloader._AsyncEngine()
+
+    async def read_twice():
+        for _ in range(2):
+            assert b"".join([data async for data in engine._body(server + "/chunked")]) == BODY
+        return sum(map(len, engine._idle.values()))
+
+    assert asyncio.run(read_twice()) == 1
+
+
+def test_async_body_sends_stream_headers(server):
+    engine = downloader._AsyncEngine()
+    engine.streamlink.http.cookies.set("session", "abc")
+    headers = json.loads(_read_body(
+        engine, server + "/echo", {"headers": {"X-Test": "1"}}
+    ).decode())
+    assert headers["X-Test"] == "1"
+    assert headers["Cookie"] == "session=abc"
+
+
+def _reset_handler(**failures):
+    _Handler.requested, _Handler.peak = [], 0
+    _Handler.failures = {"/hls/" + name: count for name, count in failures.items()}
+
+
+def test_async_run_follows_playlist_redirect(server, tmp_path):
+    _reset_handler()
+    filename = str(tmp_path / "out.ts")
+    engine = downloader._AsyncEngine(max_requests=2)
+    assert engine.run([("hls://" + server + "/index.m3u8", filename)]) == [None]
+    with open(filename, "rb") as file:
+        assert file.read() == b"".join(SEGMENTS)
+    assert len(_Handler.requested) == len(SEGMENTS)
+    assert _Handler.peak <= 2
+
+
+def test_async_run_time_range_and_errors(server, tmp_path):
+    filename = str(tmp_path / "out.ts")
+    engine = downloader._AsyncEngine()
+    results = engine.run([
+        ("hls://" + server + "/index.m3u8", filename, 2, 6),
+        ("hls://" + server + "/missing.m3u8", str(tmp_path / "missing.ts")),
+        ("only url",),
+    ])
+    assert results[0] is None
+    with open(filename, "rb") as file:
+        assert file.read() == SEGMENTS[1] + SEGMENTS[2]
+    assert results[1] and not os.path.exists(str(tmp_path / "missing.ts"))
+    assert results[2] == "Invalid job: ('only url',)"
+
+
+def test_async_run_backpressure(server):
+    _reset_handler()
+    written = []
+    release = threading.Event()
+
+    def sink(data):
+        written.append(len(_Handler.requested))
+        release.wait(5)  # writer stalls on first segment
+
+    engine = downloader._AsyncEngine(queue_size=1)
+    thread = threading.Thread(target=engine.run, args=(
+        [("hls://" + server + "/index.m3u8", sink)],
+    ))
+    thread.start()
+    time.sleep(0.5)
+    # stalled writer holds 1 segment, queue 1 more, and fetcher 1 waiting to put
+    assert len(_Handler.requested) <= 3
+    release.set()
+    thread.join(5)
+    assert len(_Handler.requested) == len(SEGMENTS) and len(written) == len(SEGMENTS)
+
+
+def _mark_processed(filename):
+    if not os.path.exists(filename):
+        return "missing " + os.path.basename(filename)
+    with open(filename + ".done", "w"):
+        pass
+    return None
+
+
+def _sleep(filename):
+    time.sleep(30)
+
+
+def test_post_process_stage(tmp_path):
+    existing, missing = str(tmp_path / "a.ts"), str(tmp_path / "b.ts")
+    with open(existing, "wb") as file:
+        file.write(b"data")
+    stage = downloader._PostProcessStage(_mark_processed, workers=2)
+    try:
+        stage.submit(existing)
+        stage.submit(missing)
+        while not stage.poll(timeout=5):
+            pass
+    finally:
+        stage.close()
+    assert os.path.exists(existing + ".done")
+    assert stage.errors == [(missing, "missing b.ts")]
+    assert stage.status() == "2/2 processed, 1 failed"
+
+
+def test_post_process_stage_cancel_does_not_wait(tmp_path):
+    stage = downloader._PostProcessStage(_sleep, workers=1)
+    for name in "abc":
+        stage.submit(str(tmp_path / name))
+    time.sleep(0.5)  # first one is running
+    started = time.monotonic()
+    stage.close(cancel=True)
+    assert time.monotonic() - started < 2
+    assert not stage.pending
+
+
+@pytest.mark.parametrize("engine", ["sync", "async"])
+def test_download_post_processes_rotated_parts(server, tmp_path, engine):
+    filename = str(tmp_path / "r.ts")
+    assert downloader.download(
+        [("hls://" + server + "/index.m3u8", filename)], engine=engine,
+        post_processor=_mark_processed, max_duration=4,
+    ) == 0
+    assert sorted(name for name in os.listdir(str(tmp_path)) if name.endswith(".done")) == [
+        "r.001.ts.done", "r.002.ts.done", "r.003.ts.done",
+    ]
+
+
+class _BrokenPipe(object):
+    def write(self, data):
+        raise BrokenPipeError(32, "Broken pipe")
+
+    def flush(self):
+        raise BrokenPipeError(32, "Broken pipe")
+
+
+def test_open_sink_callback_and_writable():
+    chunks, buffer = [], io.BytesIO()
+    for target in (chunks.append, buffer):
+        with contextlib.closing(downloader._open_sink(target)) as sink:
+            sink.write(b"ab")
+            sink.write(b"c")
+    assert chunks == [b"ab", b"c"] and buffer.getvalue() == b"abc"
+    assert not buffer.closed  # caller's writable is only flushed
+
+
+@pytest.mark.skipif(not hasattr(os, "mkfifo"), reason="no named pipe")
+def test_open_sink_named_pipe(server, tmp_path):
+    path = str(tmp_path / "fifo")
+    received = []
+
+    def consume():
+        while not os.path.exists(path):
+            time.sleep(0.01)
+        with open(path, "rb") as fifo:
+            received.append(fifo.read())
+
+    consumer = threading.Thread(target=consume)
+    consumer.start()
+    assert downloader._download(
+        "hls://" + server + "/index.m3u8", downloader.PIPE_PREFIX + path
+    ) is None
+    consumer.join(5)
+    assert received == [b"".join(SEGMENTS)]
+
+
+@pytest.mark.parametrize("engine", ["sync", "async"])
+def test_download_broken_pipe_is_error_message(server, engine):
+    job = ("httpstream://" + server + "/length", _BrokenPipe())
+    if engine == "sync":
+        error = downloader._download(*job)
+    else:
+        error, = downloader._AsyncEngine().run([job])
+    assert error.startswith("Error when writing to output")
+
+
+def test_async_writers_are_shared(server):
+    threads = set()
+
+    def sink(data):
+        threads.add(threading.current_thread().name)
+
+    engine = downloader._AsyncEngine(writers=2)
+    jobs = [("hls://" + server + "/index.m3u8", sink) for _ in range(10)]
+    assert engine.run(jobs) == [None] * 10
+    assert len(threads) <= 2
+
+
+def test_probe_all(server):
+    results = downloader._probe_all([
+        ("hls://" + server + "/index.m3u8", "/videos/ok.ts"),
+        ("hls://" + server + "/missing.m3u8", "/videos/missing.ts"),
+        ("unknown://nothing", "/videos/none.ts"),
+    ], workers=2)
+    ok, missing, unknown = results
+    assert ok.error is None and ok.plugin == "hls" and ok.kind == "HLSStream"
+    assert ok.segment == server + "/hls/seg0.ts"  # resolved after redirect
+    assert missing.error and missing.filename == "/videos/missing.ts"
+    assert unknown.error == "No plugin can handle URL: unknown://nothing"
+
+    table = downloader._format_probe_table(results).splitlines()
+    assert table[0].split() == ["file", "plugin", "variant", "type", "result"]
+    assert table[1].split()[:4] == ["ok.ts", "hls", "live", "HLSStream"]
+    assert table[1].endswith("ok")
+    assert table[3].startswith("none.ts") and table[3].endswith(unknown.error)
+
+
+def test_meter_sample_ewma_and_eta():
+    meter = downloader._Meter("job", 0.0)
+    meter.written = 1000
+    meter.sample(1.0, alpha=0.5)
+    assert meter.rate == 1000 and meter.elapsed == 1.0
+    assert meter.eta is None  # nothing known of total
+    meter.written, meter.position, meter.planned = 4000, 2.0, 8.0
+    meter.sample(2.0, alpha=0.5)
+    assert meter.rate == 0.5 * 3000 + 0.5 * 1000
+    # 2 of 8 media seconds took 4000 bytes: 12000 left at 2000 bytes/s
+    assert meter.eta == pytest.approx(6.0)
+    meter.finish(4.0)
+    assert meter.rate == 1000 and meter.eta is None
+
+
+def test_meter_clock_totals(tmp_path):
+    clock = downloader._MeterClock(interval=0.01)
+    try:
+        first, second = clock.meter("a"), clock.meter("b")
+        first.written, second.written = 100, 200
+        clock.done(first)
+        ticks = clock.ticks
+        while clock.ticks == ticks:
+            time.sleep(0.01)
+        snapshot = clock.snapshot()
+        assert snapshot["total"]["written"] == 300
+        assert [job["name"] for job in snapshot["jobs"]] == ["b"]
+        metrics = str(tmp_path / "metrics.json")
+        downloader._write_metrics(clock, metrics)
+        with open(metrics) as file:
+            assert json.load(file)["total"]["written"] == 300
+    finally:
+        clock.close()
+
+
+def test_progress_iterator_sets_eta_fields():
+    clock = downloader._MeterClock(interval=0.01)
+    segments = [
+        downloader._SegmentData.of(b"x" * 100, _segment(index, 2.0), 2.0 * (index + 1), 8.0)
+        for index in range(4)
+    ]
+    meters = []
+
+    def slow():
+        for data in segments:
+            meters.extend(clock.meters)
+            time.sleep(0.05)
+            yield data
+
+    try:
+        progress = downloader._make_console_progress(clock)
+        assert b"".join(progress(slow(), "out.ts")) == b"x" * 400
+    finally:
+        clock.close()
+    meter = meters[0]
+    assert meter.written == 400 and meter.planned == 8.0 and meter.position
+    assert clock.total.written == 400